@@ -1,33 +1,165 @@
 # client1.py - PyQt5 GUI Client with Room Management
 import sys
 import socket
-import json
 import os
 import struct
+import hashlib
 import logging
+import select
+import stat
+import selectors
+import threading
+import queue
+import time
+import random
+import itertools
+import functools
+from concurrent.futures import Future, TimeoutError as FutureTimeout, wait as wait_futures, FIRST_COMPLETED
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout,
-                            QWidget, QPushButton, QTextEdit, QLabel, QLineEdit,
-                            QTableWidget, QTableWidgetItem, QHeaderView, QGroupBox,
+                            QWidget, QPushButton, QPlainTextEdit, QLabel, QLineEdit,
+                            QTableView, QAbstractItemView, QHeaderView, QGroupBox,
                             QFileDialog, QMessageBox, QTabWidget, QInputDialog,
                             QComboBox, QSplitter, QProgressBar, QStatusBar, QFrame)
-from PyQt5.QtCore import QThread, pyqtSignal, Qt, QTimer, QMutex
+from PyQt5.QtCore import QThread, pyqtSignal, Qt, QTimer, QEvent, QAbstractTableModel, QModelIndex
 from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
-import uuid
+import msgpack
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Socket buffer size for file transfers. The kernel caps the effective value
+# at net.core.rmem_max / net.core.wmem_max, so raise those sysctls as well on
+# fast links.
+BUF_BYTES = 8 * 1024 * 1024
+
+# File transfer chunk size
+CHUNK = 1 << 20
+
+# Bytes handed to sendfile() per call; progress is reported between calls
+SENDFILE_STEP = 8 * 1024 * 1024
+
+# Chunks read ahead of the socket when sendfile() is unavailable
+READ_AHEAD = 4
+
+# Reconnect backoff: RECONNECT_BASE_DELAY doubled per attempt, capped at
+# MAX_BACKOFF_SECONDS, plus up to RECONNECT_JITTER of random jitter
+RECONNECT_BASE_DELAY = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+RECONNECT_JITTER = 0.5
+
+# TCP keepalive: first probe after KEEPALIVE_IDLE idle seconds, then every
+# KEEPALIVE_INTERVAL seconds, dropping the peer after KEEPALIVE_COUNT misses
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+
+# Minimum time between two progress signals of one transfer (seconds), and
+# bytes transferred before the time and percentage are even looked at
+PROGRESS_INTERVAL = 0.05
+PROGRESS_MIN_BYTES = 256 * 1024
+
+# Seconds to wait for a response, and for an upload that has stopped
+# moving before it is given up
+RESPONSE_TIMEOUT = 30
+TRANSFER_STALL_TIMEOUT = 30
+
+# Largest response accepted from the server, and the per-request limits
+# below it; a response larger than every pending request allows is rejected
+MAX_RESPONSE = 10 * 1024 * 1024
+MAX_CONTROL_RESPONSE = 64 * 1024
+MAX_ROOM_LIST = 256 * 1024
+MAX_FILE_LIST = 4 * 1024 * 1024
+
+# recv_into() step while reading a response
+RECV_STEP = 64 * 1024
+
+# Most queued frames the sender writes with a single sendmsg() call
+SEND_BATCH = 64
+
+# 4-byte big-endian length prefix of every message
+_HDR = struct.Struct('!I')
+
+# Queued to the sender thread to make it exit
+_STOP_SENDER = object()
+
+# Units of format_size, each 1024 times the previous
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB')
+
+@functools.lru_cache(maxsize=1024)
+def format_size(size_bytes):
+    """Format file size in human readable format"""
+    if size_bytes == 0:
+        return "0B"
+    
+    # Every unit is 2**10 larger, so the unit index is read off the bit
+    # length instead of dividing in a loop
+    i = 0
+    if size_bytes >= 1024:
+        i = min((int(size_bytes).bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    
+    return f"{size_bytes / (1 << (10 * i)):.1f}{_SIZE_UNITS[i]}"
+
+class FileRow:
+    """One row of the files table, with the size already formatted"""
+    __slots__ = ('id', 'name', 'size', 'type', 'uploader', 'date')
+    
+    def __init__(self, file_id, name, size, file_type, uploader, date):
+        self.id = file_id
+        self.name = name
+        self.size = size
+        self.type = file_type
+        self.uploader = uploader
+        self.date = date
+    
+    def _key(self):
+        return (self.id, self.name, self.size, self.type, self.uploader, self.date)
+    
+    def __eq__(self, other):
+        # Compared by value so an unchanged file list is recognised
+        if not isinstance(other, FileRow):
+            return NotImplemented
+        return self._key() == other._key()
+    
+    def __hash__(self):
+        return hash(self._key())
+
+class ProgressReporter:
+    """Throttle a progress signal to percent changes at most every PROGRESS_INTERVAL"""
+    
+    def __init__(self, signal, total):
+        self.signal = signal
+        self.total = total
+        self.last_progress = -1
+        self.last_time = 0.0
+        self.last_checked = 0
+    
+    def update(self, done):
+        # recv() often returns far less than a chunk; skip those cheaply
+        if done - self.last_checked < PROGRESS_MIN_BYTES:
+            return
+        self.last_checked = done
+        
+        progress = int((done / self.total) * 100)
+        now = time.monotonic()
+        if progress != self.last_progress and now - self.last_time >= PROGRESS_INTERVAL:
+            self.signal.emit(progress)
+            self.last_progress = progress
+            self.last_time = now
+
 class ClientThread(QThread):
     log_message = pyqtSignal(str)
     connection_status_changed = pyqtSignal(bool, str)
-    room_list_updated = pyqtSignal(list)
-    file_list_updated = pyqtSignal(list)
+    room_list_updated = pyqtSignal(object)  # [(id, name, owner, member_count, created_at)]
+    file_list_updated = pyqtSignal(object)  # [FileRow]
     room_joined = pyqtSignal(str, str)  # room_id, room_name
     upload_progress = pyqtSignal(int)  # progress percentage
     download_progress = pyqtSignal(int)  # progress percentage
     room_updated = pyqtSignal(str, str, int)  # room_id, room_name, member_count
+    rooms_changed = pyqtSignal()  # pushed by the server
+    files_changed = pyqtSignal(str)  # room_id, pushed by the server
+    push_enabled = pyqtSignal(bool)  # whether the server accepted subscribe
     
     def __init__(self, host='localhost', port=8888):
         super().__init__()
@@ -38,15 +170,39 @@ class ClientThread(QThread):
         self.current_room_id = None
         self.current_room_name = None
         self.username = "Anonymous"
-        self.mutex = QMutex()
         self.auto_reconnect = True
         self.reconnect_attempts = 0
         self.max_reconnect_attempts = 5
         self.connected = False
+        self._lost_on_timeout = False
+        
+        # Responses are matched to requests by request_id
+        self._request_ids = itertools.count(1)
+        self._pending = {}  # request_id -> (Future, on_response, expected_max)
+        self._pending_lock = threading.Lock()
+        
+        # Everything written to the socket goes through one sender thread
+        self._send_q = queue.SimpleQueue()
+        self.transfer_sent = 0  # bytes of the current upload on the wire
+        self._sender = None
+        
+        # Written to by wake() to interrupt the reader's select(); a socket
+        # pair rather than os.pipe() so it also works with select on Windows
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        
+        # Only the reader thread receives responses, so it can reuse one buffer
+        self._recv_buf = bytearray(RECV_STEP)
+        
+        # Pre-encoded frames for requests that never change
+        self._list_rooms_prefix = self.frame_prefix({'command': 'list_rooms'})
+        self._list_files_prefix = self.frame_prefix({'command': 'list'})
+        self._leave_room_prefix = self.frame_prefix({'command': 'leave_room', 'username': self.username})
     
     def set_username(self, username):
         """Set the client username"""
         self.username = username
+        self._leave_room_prefix = self.frame_prefix({'command': 'leave_room', 'username': username})
     
     def connect_to_server(self):
         """Connect to the server with retry logic"""
@@ -59,10 +215,26 @@ class ClientThread(QThread):
                 self.socket = None
             
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Disable Nagle so small requests are not delayed, and set the
+            # buffers before connecting so the window scale is negotiated
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, BUF_BYTES)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUF_BYTES)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # Let the kernel notice a dead server instead of waiting on a
+            # request timeout; the TCP_KEEP* options are missing on some
+            # platforms
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for option, value in (('TCP_KEEPIDLE', KEEPALIVE_IDLE),
+                                  ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL),
+                                  ('TCP_KEEPCNT', KEEPALIVE_COUNT)):
+                if hasattr(socket, option):
+                    self.socket.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
             self.socket.settimeout(10.0)
             self.socket.connect((self.host, self.port))
             self.running = True
             self.connected = True
+            self._lost_on_timeout = False
             self.reconnect_attempts = 0
             
             self.connection_status_changed.emit(True, f"Connected to {self.host}:{self.port}")
@@ -82,6 +254,8 @@ class ClientThread(QThread):
         self.running = False
         self.connected = False
         self.auto_reconnect = False
+        self._send_q.put_nowait(_STOP_SENDER)
+        self.wake()
         
         if self.socket:
             try:
@@ -95,54 +269,311 @@ class ClientThread(QThread):
         self.connection_status_changed.emit(False, "Disconnected")
         self.log_message.emit("Disconnected from server")
     
-    def send_request(self, request):
-        """Send JSON request to server with error handling"""
+    def wake(self):
+        """Interrupt the reader thread's select() so it rechecks its state"""
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+    
+    def drain_wake(self):
+        """Discard pending wake() bytes so the next select() blocks again"""
+        try:
+            while self._wake_r.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def drop_connection(self):
+        """Give up on a stream that can no longer be kept in sync
+        
+        Shutting the socket down makes the reader see EOF, so the usual
+        reconnect takes over.
+        """
+        self.connected = False
+        if self.socket:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
+    def send_request(self, request, on_response=None, expected_max=MAX_CONTROL_RESPONSE):
+        """Send msgpack request to server, returning a Future for its response
+        
+        on_response, if given, is called on the reader thread with the
+        response before the Future resolves; its return value becomes the
+        result. It is used to consume raw data that follows a response.
+        expected_max is the largest response size the request may get.
+        """
         if not self.socket or not self.running or not self.connected:
-            return False
+            return None
+        
+        request['request_id'] = next(self._request_ids) & 0xFFFFFFFF
+        future = self.expect_response(request['request_id'], on_response, expected_max)
         
-        self.mutex.lock()
         try:
-            request_data = json.dumps(request).encode('utf-8')
-            length_data = struct.pack('!I', len(request_data))
-            self.socket.send(length_data + request_data)
-            return True
+            request_data = msgpack.packb(request, use_bin_type=True)
+            length_data = _HDR.pack(len(request_data))
+            self._send_q.put_nowait((length_data, request_data))
+            return future
         except Exception as e:
+            with self._pending_lock:
+                self._pending.pop(request['request_id'], None)
             self.log_message.emit(f"Error sending request: {e}")
             logger.error(f"Error sending request: {e}")
+            return None
+    
+    def frame_prefix(self, request):
+        """Pre-encode a constant request, leaving only its request_id to add
+        
+        A msgpack map with fewer than 16 entries is a one-byte header followed
+        by its key/value pairs, so request_id can be appended as one more pair.
+        """
+        body = msgpack.packb(request, use_bin_type=True)
+        return bytes([0x80 | (len(request) + 1)]) + body[1:] + msgpack.packb('request_id')
+    
+    def send_cached(self, prefix, on_response=None, expected_max=MAX_CONTROL_RESPONSE):
+        """Send a request pre-encoded by frame_prefix, like send_request"""
+        if not self.socket or not self.running or not self.connected:
+            return None
+        
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        future = self.expect_response(request_id, on_response, expected_max)
+        
+        id_data = msgpack.packb(request_id)
+        length_data = _HDR.pack(len(prefix) + len(id_data))
+        self._send_q.put_nowait((length_data, prefix, id_data))
+        return future
+    
+    def run_on_sender(self, fn):
+        """Run fn on the sender thread after the frames queued so far
+        
+        Used for raw file data, which must not interleave with frames.
+        Returns a Future for fn's result.
+        """
+        job = Future()
+        self._send_q.put_nowait((job, fn))
+        return job
+    
+    def send_loop(self):
+        """Sender thread: the only writer, coalescing queued frames"""
+        held = None
+        while True:
+            item = held if held is not None else self._send_q.get()
+            held = None
+            if item is _STOP_SENDER:
+                break
+            
+            if isinstance(item[0], Future):
+                job, fn = item
+                if job.set_running_or_notify_cancel():
+                    try:
+                        job.set_result(fn())
+                    except Exception as e:
+                        job.set_exception(e)
+                continue
+            
+            # Gather whatever else is already queued into one sendmsg()
+            buffers = list(item)
+            while len(buffers) < SEND_BATCH * 2:
+                try:
+                    item = self._send_q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP_SENDER or isinstance(item[0], Future):
+                    held = item
+                    break
+                buffers.extend(item)
+            
+            # On failure the frames are dropped but the sender keeps running
+            # so it can serve the socket of a later reconnect
+            self.send_buffers(buffers)
+        
+        # Nothing else will be sent; release anyone waiting on a job
+        while True:
+            try:
+                item = self._send_q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP_SENDER and isinstance(item[0], Future):
+                item[0].cancel()
+    
+    def send_buffers(self, buffers):
+        """Write a list of buffers to the socket"""
+        try:
+            if not self.socket:
+                return False
+            if hasattr(self.socket, 'sendmsg'):
+                # Scatter-gather the buffers without concatenating them
+                try:
+                    sent = self.socket.sendmsg(buffers)
+                except socket.timeout:
+                    # Nothing was written, so the stream is still in sync
+                    # and the connection may be worth probing
+                    self._lost_on_timeout = True
+                    raise
+                if sent < sum(len(b) for b in buffers):
+                    self.socket.sendall(b''.join(buffers)[sent:])
+            else:
+                self.socket.sendall(b''.join(buffers))
+            return True
+        except Exception as e:
+            if self.running:
+                self.log_message.emit(f"Error sending request: {e}")
+                logger.error(f"Error sending request: {e}")
             self.connected = False
+            self.fail_pending()
+            self.wake()
             return False
-        finally:
-            self.mutex.unlock()
     
-    def receive_response(self, timeout=30):
-        """Receive JSON response from server with timeout"""
+    def expect_response(self, request_id, on_response=None, expected_max=MAX_CONTROL_RESPONSE):
+        """Register interest in the next response carrying request_id"""
+        future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = (future, on_response, expected_max)
+        return future
+    
+    def response_limit(self):
+        """Largest response size any pending request allows"""
+        with self._pending_lock:
+            return max((entry[2] for entry in self._pending.values()), default=MAX_CONTROL_RESPONSE)
+    
+    def wait_response(self, future, timeout=RESPONSE_TIMEOUT):
+        """Wait for the reader thread to deliver a response"""
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            self.forget_response(future)
+            self.log_message.emit("Server response timeout")
+            return None
+    
+    def forget_response(self, future):
+        """Stop waiting for the response a Future stands for"""
+        with self._pending_lock:
+            for request_id, entry in list(self._pending.items()):
+                if entry[0] is future:
+                    del self._pending[request_id]
+    
+    def wait_transfer(self, job):
+        """Wait for a file transfer on the sender thread
+        
+        There is no overall limit, since big files take long, but the wait
+        ends once no bytes have moved for TRANSFER_STALL_TIMEOUT.
+        """
+        last_sent = -1
+        while True:
+            try:
+                return job.result(timeout=TRANSFER_STALL_TIMEOUT)
+            except FutureTimeout:
+                if self.transfer_sent == last_sent:
+                    # Part of the file may be on the wire; the stream is lost
+                    self.log_message.emit("File transfer stalled")
+                    self.drop_connection()
+                    return None
+                last_sent = self.transfer_sent
+    
+    def dispatch_response(self, response):
+        """Hand a response read by the reader thread to whoever awaits it"""
+        request_id = response.get('request_id')
+        if request_id is None and 'event' in response:
+            self.handle_event(response)
+            return
+        
+        with self._pending_lock:
+            if request_id is None and self._pending:
+                # Servers that do not echo request ids answer in order
+                request_id = next(iter(self._pending))
+            entry = self._pending.pop(request_id, None)
+        
+        if entry is None:
+            logger.warning(f"Dropping unexpected response for request {request_id}")
+            return
+        
+        future, on_response, _ = entry
+        try:
+            if on_response:
+                response = on_response(response)
+        except Exception as e:
+            self.log_message.emit(f"Error handling response: {e}")
+        future.set_result(response)
+    
+    def handle_event(self, event):
+        """Turn a change event pushed by the server into a signal"""
+        name = event.get('event')
+        if name == 'rooms_changed':
+            self.rooms_changed.emit()
+        elif name == 'files_changed':
+            self.files_changed.emit(event.get('room_id', ''))
+    
+    def subscribe(self):
+        """Ask the server to push change events instead of being polled"""
+        def on_subscribed(response):
+            self.push_enabled.emit(response.get('status') == 'success')
+            return response
+        
+        # Don't wait: this may run on the reader thread during a reconnect
+        self.send_request({'command': 'subscribe'}, on_response=on_subscribed)
+    
+    def fail_pending(self):
+        """Release every waiter when the connection goes away"""
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, _, _ in pending:
+            future.set_result(None)
+    
+    def receive_response(self, timeout=30, expected_max=MAX_RESPONSE):
+        """Receive msgpack response from server with timeout"""
+        received = 0  # Bytes of this frame read so far
         try:
             if not self.socket or not self.connected:
                 return None
             
             self.socket.settimeout(timeout)
-            length_data = self.socket.recv(4)
-            if not length_data:
-                self.connected = False
-                return None
+            length_data = bytearray(_HDR.size)
+            while received < _HDR.size:
+                n = self.socket.recv_into(memoryview(length_data)[received:])
+                if not n:
+                    self.connected = False
+                    return None
+                received += n
             
-            length = struct.unpack('!I', length_data)[0]
+            length = _HDR.unpack(length_data)[0]
             
-            if length > 10 * 1024 * 1024:  # 10MB limit
+            if length > min(expected_max, MAX_RESPONSE):
+                # The rest of the stream cannot be trusted; drop the
+                # connection instead of buffering the oversized body
+                self.log_message.emit(f"Rejected {length} byte response (limit {expected_max})")
+                logger.error(f"Rejected {length} byte response (limit {expected_max})")
+                self.drop_connection()
                 return None
             
-            data = b''
-            while len(data) < length:
-                chunk = self.socket.recv(min(8192, length - len(data)))
-                if not chunk:
+            # Decode while the body arrives instead of after it has all landed
+            unpacker = msgpack.Unpacker(raw=False, max_buffer_size=length)
+            view = memoryview(self._recv_buf)
+            remaining = length
+            while remaining:
+                n = self.socket.recv_into(view, min(remaining, RECV_STEP))
+                if not n:
                     self.connected = False
                     return None
-                data += chunk
+                unpacker.feed(view[:n])
+                remaining -= n
+                received += n
             
-            return json.loads(data.decode('utf-8'))
+            try:
+                return next(unpacker)
+            except StopIteration:
+                self.log_message.emit("Truncated response from server")
+                return None
             
         except socket.timeout:
-            self.log_message.emit("Server response timeout")
+            if received:
+                # The rest of the frame would be read as the next header
+                self.log_message.emit("Server response timed out mid-frame")
+                self.drop_connection()
+            else:
+                self.log_message.emit("Server response timeout")
             return None
         except Exception as e:
             self.log_message.emit(f"Error receiving response: {e}")
@@ -151,47 +582,113 @@ class ClientThread(QThread):
             return None
     
     def receive_file_data(self, file_path, file_size):
-        """Receive file data from server with progress"""
+        """Receive file data from server with progress
+        
+        The file bytes share the stream with responses, so a transfer that
+        stops short drops the connection rather than leave them unread.
+        """
+        received = 0
         try:
+            buffer = bytearray(CHUNK)
+            view = memoryview(buffer)
             with open(file_path, 'wb') as f:
-                received = 0
+                progress = ProgressReporter(self.download_progress, file_size)
                 while received < file_size:
-                    chunk_size = min(8192, file_size - received)
-                    chunk = self.socket.recv(chunk_size)
-                    if not chunk:
+                    chunk_size = min(CHUNK, file_size - received)
+                    n = self.socket.recv_into(view, chunk_size)
+                    if not n:
                         break
-                    f.write(chunk)
-                    received += len(chunk)
+                    f.write(view[:n])
+                    received += n
                     
-                    progress = int((received / file_size) * 100)
-                    self.download_progress.emit(progress)
-            
-            return received == file_size
+                    progress.update(received)
         except Exception as e:
             self.log_message.emit(f"Error receiving file: {e}")
-            return False
+        if received == file_size:
+            return True
+        self.drop_connection()
+        return False
     
     def send_file_data(self, file_path):
         """Send file data to server with progress"""
         try:
             file_size = os.path.getsize(file_path)
             sent = 0
+            progress = ProgressReporter(self.upload_progress, file_size)
+            self.transfer_sent = 0
             
             with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(8192)
-                    if not chunk:
-                        break
-                    self.socket.send(chunk)
-                    sent += len(chunk)
-                    
-                    progress = int((sent / file_size) * 100)
-                    self.upload_progress.emit(progress)
+                if hasattr(os, 'sendfile') and stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+                    # Zero-copy path: the kernel moves the bytes from the page
+                    # cache to the socket without passing through Python
+                    while sent < file_size:
+                        count = min(SENDFILE_STEP, file_size - sent)
+                        n = self.socket.sendfile(f, sent, count)
+                        if not n:
+                            break
+                        sent += n
+                        self.transfer_sent = sent
+                        
+                        progress.update(sent)
+                else:
+                    # socket.sendfile() would quietly fall back to 8 KiB
+                    # reads and sends here (e.g. on Windows)
+                    sent = self.send_read_ahead(f, progress)
             
-            return True
+            if sent == file_size:
+                return True
+            self.log_message.emit("File ended before its announced size")
         except Exception as e:
             self.log_message.emit(f"Error sending file: {e}")
+        # The server still expects the rest of the file and an unknown part
+        # of it may be on the wire, so the stream cannot be resynchronised
+        self.drop_connection()
+        return False
+    
+    def send_read_ahead(self, f, progress):
+        """Send a file while a helper thread reads the next chunks from disk"""
+        chunks = queue.Queue(maxsize=READ_AHEAD)
+        abort = threading.Event()
+        
+        def offer(item):
+            # Give up once the sending side has stopped taking chunks
+            while not abort.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
             return False
+        
+        def read_chunks():
+            try:
+                for chunk in iter(lambda: f.read(CHUNK), b''):
+                    if not offer(chunk):
+                        return
+            except Exception as e:
+                offer(e)
+                return
+            offer(None)
+        
+        reader = threading.Thread(target=read_chunks, daemon=True)
+        reader.start()
+        sent = 0
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                self.socket.sendall(chunk)
+                sent += len(chunk)
+                self.transfer_sent = sent
+                
+                progress.update(sent)
+        finally:
+            abort.set()
+            reader.join()
+        return sent
     
     def create_room(self, room_name):
         """Create a new room"""
@@ -202,10 +699,11 @@ class ClientThread(QThread):
                 'username': self.username
             }
             
-            if not self.send_request(request):
+            future = self.send_request(request)
+            if not future:
                 return False, "Failed to send request"
             
-            response = self.receive_response()
+            response = self.wait_response(future)
             if response and response.get('status') == 'success':
                 self.current_room_id = response.get('room_id')
                 self.current_room_name = room_name
@@ -228,15 +726,16 @@ class ClientThread(QThread):
                 'username': self.username
             }
             
-            if not self.send_request(request):
+            future = self.send_request(request)
+            if not future:
                 return False, "Failed to send request"
             
-            response = self.receive_response()
+            response = self.wait_response(future)
             if response and response.get('status') == 'success':
                 self.current_room_id = room_id
                 self.current_room_name = response.get('room_name')
                 self.room_joined.emit(room_id, self.current_room_name)
-                self.list_rooms()  # Refresh room list to get updated member count
+                self.refresh_lists()  # Refresh rooms (member count) and files
                 return True, response.get('message', 'Joined room successfully')
             else:
                 return False, response.get('message', 'Failed to join room') if response else 'No response from server'
@@ -251,20 +750,16 @@ class ClientThread(QThread):
             return True, "Not in any room"
         
         try:
-            request = {
-                'command': 'leave_room',
-                'username': self.username
-            }
-            
-            if not self.send_request(request):
+            future = self.send_cached(self._leave_room_prefix)
+            if not future:
                 return False, "Failed to send request"
             
-            response = self.receive_response()
+            response = self.wait_response(future)
             if response and response.get('status') == 'success':
                 self.current_room_id = None
                 self.current_room_name = None
                 self.room_joined.emit("", "")
-                self.list_rooms()  # Refresh room list
+                self.refresh_lists()  # Refresh rooms and files
                 return True, response.get('message', 'Left room successfully')
             else:
                 return False, response.get('message', 'Failed to leave room') if response else 'No response from server'
@@ -282,16 +777,17 @@ class ClientThread(QThread):
                 'username': self.username
             }
             
-            if not self.send_request(request):
+            future = self.send_request(request)
+            if not future:
                 return False, "Failed to send request"
             
-            response = self.receive_response()
+            response = self.wait_response(future)
             if response and response.get('status') == 'success':
                 if self.current_room_id == room_id:
                     self.current_room_id = None
                     self.current_room_name = None
                     self.room_joined.emit("", "")
-                self.list_rooms()  # Refresh room list
+                self.refresh_lists()  # Refresh rooms and files
                 return True, response.get('message', 'Room deleted successfully')
             else:
                 return False, response.get('message', 'Failed to delete room') if response else 'No response from server'
@@ -303,33 +799,38 @@ class ClientThread(QThread):
     def list_rooms(self):
         """List all available rooms"""
         try:
-            request = {'command': 'list_rooms'}
-            
-            if not self.send_request(request):
+            future = self.send_cached(self._list_rooms_prefix, expected_max=MAX_ROOM_LIST)
+            if not future:
                 return
             
-            response = self.receive_response()
-            if response and response.get('status') == 'success':
-                rooms = response.get('rooms', [])
-                self.room_list_updated.emit(rooms)
-                
-                # Update room information if we're in a room
-                if self.current_room_id:
-                    for room in rooms:
-                        if room.get('id') == self.current_room_id:
-                            self.current_room_name = room.get('name')
-                            self.room_updated.emit(
-                                self.current_room_id,
-                                room.get('name'),
-                                room.get('member_count', 0)
-                            )
-                            break
-            else:
-                self.log_message.emit(f"List rooms failed: {response.get('message', 'No response') if response else 'No response from server'}")
+            self.handle_room_list(self.wait_response(future))
                 
         except Exception as e:
             self.log_message.emit(f"List rooms error: {e}")
     
+    def handle_room_list(self, response):
+        """Publish a list_rooms response to the GUI"""
+        if response and response.get('status') == 'success':
+            rooms = response.get('rooms', [])
+            self.room_list_updated.emit([
+                (r.get('id', ''), r['name'], r['owner'], r.get('member_count', 0), r.get('created_at', ''))
+                for r in rooms
+            ])
+            
+            # Update room information if we're in a room
+            if self.current_room_id:
+                for room in rooms:
+                    if room.get('id') == self.current_room_id:
+                        self.current_room_name = room.get('name')
+                        self.room_updated.emit(
+                            self.current_room_id,
+                            room.get('name'),
+                            room.get('member_count', 0)
+                        )
+                        break
+        else:
+            self.log_message.emit(f"List rooms failed: {response.get('message', 'No response') if response else 'No response from server'}")
+    
     def upload_file(self, file_path, description=""):
         """Upload a file to the current room"""
         if not self.current_room_id:
@@ -342,26 +843,46 @@ class ClientThread(QThread):
             if file_size > 500 * 1024 * 1024:
                 return False, "File too large (max 500MB)"
             
+            # Checksum for the server to verify the transfer against
+            with open(file_path, 'rb') as f:
+                checksum = hashlib.file_digest(f, 'sha256').hexdigest()
+            
             request = {
                 'command': 'upload',
                 'filename': filename,
                 'file_size': file_size,
                 'uploader': self.username,
-                'description': description
+                'description': description,
+                'sha256': checksum
             }
             
-            if not self.send_request(request):
+            final = []
+            
+            def on_ready(response):
+                # Runs on the reader thread before it reads the next reply,
+                # so the final one (sent right after 'ready' for an empty
+                # file) always finds a waiter
+                if response.get('status') == 'ready':
+                    final.append(self.expect_response(request['request_id']))
+                return response
+            
+            future = self.send_request(request, on_response=on_ready)
+            if not future:
                 return False, "Failed to send upload request"
             
-            response = self.receive_response()
+            response = self.wait_response(future)
             if not response or response.get('status') != 'ready':
                 return False, response.get('message', 'Server not ready for upload') if response else 'No response from server'
             
+            # The server answers again once it has the whole file
+            future = final[0]
+            
             self.upload_progress.emit(0)
-            if not self.send_file_data(file_path):
+            if not self.wait_transfer(self.run_on_sender(lambda: self.send_file_data(file_path))):
+                self.forget_response(future)
                 return False, "Failed to send file data"
             
-            response = self.receive_response()
+            response = self.wait_response(future)
             if response and response.get('status') == 'success':
                 self.upload_progress.emit(100)
                 self.log_message.emit(f"File uploaded: {filename} (ID: {response.get('file_id')})")
@@ -381,20 +902,34 @@ class ClientThread(QThread):
         
         try:
             request = {'command': 'download', 'file_id': file_id}
+            started = Future()
+            
+            def receive_file(response):
+                # Runs on the reader thread: the file bytes follow the response
+                started.set_result(True)
+                if response.get('status') == 'success':
+                    output_file = os.path.join(output_path, response.get('filename'))
+                    self.download_progress.emit(0)
+                    response['received'] = self.receive_file_data(output_file, response.get('file_size'))
+                return response
             
-            if not self.send_request(request):
+            future = self.send_request(request, on_response=receive_file)
+            if not future:
                 return False, "Failed to send download request"
             
-            response = self.receive_response()
+            # Only the reply header is timed here; the transfer after it has
+            # no overall limit and is bounded by the socket timeouts
+            done, _ = wait_futures((started, future), timeout=RESPONSE_TIMEOUT, return_when=FIRST_COMPLETED)
+            if not done:
+                self.forget_response(future)
+                self.log_message.emit("Server response timeout")
+                return False, 'No response from server'
+            response = self.wait_response(future, timeout=None)
             if not response or response.get('status') != 'success':
                 return False, response.get('message', 'Download failed') if response else 'No response from server'
             
             filename = response.get('filename')
-            file_size = response.get('file_size')
-            output_file = os.path.join(output_path, filename)
-            
-            self.download_progress.emit(0)
-            if self.receive_file_data(output_file, file_size):
+            if response.get('received'):
                 self.download_progress.emit(100)
                 self.log_message.emit(f"File downloaded: {filename}")
                 return True, f"File downloaded: {filename}"
@@ -414,10 +949,11 @@ class ClientThread(QThread):
         try:
             request = {'command': 'delete', 'file_id': file_id}
             
-            if not self.send_request(request):
+            future = self.send_request(request)
+            if not future:
                 return False, "Failed to send delete request"
             
-            response = self.receive_response()
+            response = self.wait_response(future)
             if response and response.get('status') == 'success':
                 self.list_files()  # Refresh file list
                 return True, response.get('message', 'File deleted successfully')
@@ -435,42 +971,435 @@ class ClientThread(QThread):
             return
         
         try:
-            request = {'command': 'list'}
+            future = self.send_cached(self._list_files_prefix, expected_max=MAX_FILE_LIST)
+            if not future:
+                return
             
-            if not self.send_request(request):
+            self.handle_file_list(self.wait_response(future))
+                
+        except Exception as e:
+            self.log_message.emit(f"List files error: {e}")
+    
+    def handle_file_list(self, response):
+        """Publish a list (files) response to the GUI"""
+        if response and response.get('status') == 'success':
+            self.file_list_updated.emit([
+                FileRow(f['id'], f['name'], format_size(f['size']), f.get('type', ''), f['uploader'], f['date'])
+                for f in response.get('files', [])
+            ])
+        else:
+            self.log_message.emit(f"List files failed: {response.get('message', 'No response') if response else 'No response from server'}")
+    
+    def send_batch(self, requests, expected_max=MAX_CONTROL_RESPONSE):
+        """Send several requests in one round-trip and return their responses"""
+        future = self.send_request({'command': 'batch', 'ops': requests}, expected_max=expected_max)
+        if not future:
+            return None
+        
+        response = self.wait_response(future)
+        if response and response.get('status') == 'success':
+            results = response.get('results', [])
+            if len(results) == len(requests):
+                return results
+        return None
+    
+    def refresh_lists(self):
+        """Refresh the room list and the current room's files together"""
+        try:
+            results = self.send_batch([{'command': 'list_rooms'}, {'command': 'list'}],
+                                      expected_max=MAX_ROOM_LIST + MAX_FILE_LIST)
+            if results is None:
+                # Server without batch support
+                self.list_rooms()
+                self.list_files()
                 return
             
-            response = self.receive_response()
-            if response and response.get('status') == 'success':
-                self.file_list_updated.emit(response.get('files', []))
+            rooms_response, files_response = results
+            self.handle_room_list(rooms_response)
+            if self.current_room_id:
+                self.handle_file_list(files_response)
             else:
-                self.log_message.emit(f"List files failed: {response.get('message', 'No response') if response else 'No response from server'}")
+                self.file_list_updated.emit([])
                 
         except Exception as e:
-            self.log_message.emit(f"List files error: {e}")
+            self.log_message.emit(f"Refresh error: {e}")
+    
+    def probe_connection(self):
+        """Check whether the current socket is still usable"""
+        if not self.socket:
+            return False
+        try:
+            if self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                return False
+            # The sender thread may be using the socket, so its timeout is
+            # left alone: a zero-timeout select stands in for a non-blocking
+            # peek (MSG_DONTWAIT would still wait out the socket timeout)
+            if not select.select([self.socket], [], [], 0)[0]:
+                return True
+            # An empty peek means the server closed its end
+            return self.socket.recv(1, socket.MSG_PEEK) != b''
+        except OSError:
+            return False
     
     def attempt_reconnect(self):
         """Attempt to reconnect to server"""
         if not self.auto_reconnect or self.reconnect_attempts >= self.max_reconnect_attempts:
             return False
         
+        # A send that timed out without writing anything does not mean the
+        # server is gone; keep the socket if it has not seen an error or FIN
+        if self._lost_on_timeout:
+            self._lost_on_timeout = False
+            if self.probe_connection():
+                self.connected = True
+                self.log_message.emit("Connection still alive, resuming")
+                return True
+        
+        # Exponential backoff with jitter so clients of a flapping server
+        # do not all reconnect at the same moment
+        delay = min(RECONNECT_BASE_DELAY * 2 ** self.reconnect_attempts, MAX_BACKOFF_SECONDS)
+        delay += random.uniform(0, RECONNECT_JITTER)
+        
         self.reconnect_attempts += 1
-        self.log_message.emit(f"Attempting to reconnect... ({self.reconnect_attempts}/{self.max_reconnect_attempts})")
+        self.log_message.emit(f"Attempting to reconnect in {delay:.1f}s... ({self.reconnect_attempts}/{self.max_reconnect_attempts})")
+        # Sleep on the wake socket so a disconnect cuts the wait short; a
+        # wake() left over from the lost connection must not end it early
+        self.drain_wake()
+        deadline = time.monotonic() + delay
+        while self.auto_reconnect:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if select.select([self._wake_r], [], [], remaining)[0]:
+                self.drain_wake()
+        
+        if not self.auto_reconnect:
+            return False
         
         if self.connect_to_server():
             if self.current_room_id:
-                self.join_room(self.current_room_id)
+                # Don't wait for the reply: this is the thread that reads it
+                self.send_request({
+                    'command': 'join_room',
+                    'room_id': self.current_room_id,
+                    'username': self.username
+                })
+            self.subscribe()
             return True
         
         return False
     
+    def read_responses(self):
+        """Read and dispatch responses until the connection drops"""
+        if not self.socket:
+            return
+        
+        # Block until the server sends something or wake() is called;
+        # DefaultSelector is epoll on Linux and kqueue on macOS
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        try:
+            while self.running and self.connected:
+                for key, _ in selector.select():
+                    if key.fileobj is self._wake_r:
+                        self.drain_wake()
+                    elif self.running:
+                        response = self.receive_response(expected_max=self.response_limit())
+                        if response is not None:
+                            self.dispatch_response(response)
+        finally:
+            selector.close()
+    
     def run(self):
-        """Main client thread loop"""
+        """Main client thread loop: read responses and dispatch them"""
         if not self.connect_to_server():
             return
         
-        while self.running and self.connected:
-            self.msleep(1000)
+        self._sender = threading.Thread(target=self.send_loop, daemon=True)
+        self._sender.start()
+        self.subscribe()
+        
+        try:
+            while self.running:
+                self.read_responses()
+                self.fail_pending()
+                if not self.running:
+                    break
+                
+                # Connection lost: reconnect with backoff until we give up
+                self.log_message.emit("Connection to server lost")
+                reconnected = False
+                while (self.running and self.auto_reconnect
+                       and self.reconnect_attempts < self.max_reconnect_attempts):
+                    if self.attempt_reconnect():
+                        reconnected = True
+                        break
+                if not reconnected:
+                    self.running = False
+                    self.connection_status_changed.emit(False, "Connection lost")
+        finally:
+            self._send_q.put_nowait(_STOP_SENDER)
+            self.fail_pending()
+            self._wake_r.close()
+            self._wake_w.close()
+
+# Application stylesheet, applied once to the main window
+STYLE_BASE = """
+    QMainWindow {
+        background-color: #f8f9fa;
+    }
+    QWidget {
+        background-color: #ffffff;
+    }
+    QPushButton {
+        background-color: #3498db;
+        border: none;
+        color: white;
+        padding: 8px 16px;
+        border-radius: 6px;
+        font-weight: bold;
+        font-size: 11px;
+    }
+    QPushButton:hover {
+        background-color: #2980b9;
+    }
+    QPushButton:pressed {
+        background-color: #21618c;
+    }
+    QPushButton:disabled {
+        background-color: #bdc3c7;
+        color: #7f8c8d;
+    }
+    QLineEdit {
+        border: 2px solid #bdc3c7;
+        border-radius: 5px;
+        padding: 5px;
+        font-size: 11px;
+        background-color: white;
+    }
+    QLineEdit:focus {
+        border-color: #3498db;
+    }
+    QLabel {
+        color: #2c3e50;
+        font-size: 11px;
+    }
+    QLabel#memberCount {
+        padding: 5px;
+    }
+    QStatusBar {
+        background-color: #ecf0f1;
+        border-top: 1px solid #bdc3c7;
+        color: #2c3e50;
+        font-weight: bold;
+    }
+"""
+
+STYLE_GROUPBOX = """
+    QGroupBox {
+        font-size: 12px;
+        font-weight: bold;
+        border: 2px solid #bdc3c7;
+        border-radius: 8px;
+        margin-top: 1ex;
+        padding-top: 10px;
+    }
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        left: 10px;
+        padding: 0 5px 0 5px;
+        color: #2c3e50;
+    }
+"""
+
+STYLE_TABS = """
+    QTabWidget::pane {
+        border: 1px solid #bdc3c7;
+        border-radius: 5px;
+    }
+    QTabBar::tab {
+        background: #ecf0f1;
+        border: 1px solid #bdc3c7;
+        padding: 8px 16px;
+        margin-right: 2px;
+        border-top-left-radius: 5px;
+        border-top-right-radius: 5px;
+    }
+    QTabBar::tab:selected {
+        background: #3498db;
+        color: white;
+    }
+    QTabBar::tab:hover {
+        background: #5dade2;
+        color: white;
+    }
+"""
+
+STYLE_TABLE = """
+    QTableView {
+        gridline-color: #bdc3c7;
+        background-color: #ffffff;
+        alternate-background-color: #f8f9fa;
+    }
+    QTableView::item:selected {
+        background-color: #3498db;
+        color: white;
+    }
+"""
+
+STYLE_PROGRESS = """
+    QProgressBar {
+        border: 1px solid #bdc3c7;
+        border-radius: 5px;
+        text-align: center;
+        height: 20px;
+    }
+    QProgressBar::chunk {
+        border-radius: 5px;
+    }
+    QProgressBar#uploadProgress::chunk {
+        background-color: #27ae60;
+    }
+    QProgressBar#downloadProgress::chunk {
+        background-color: #3498db;
+    }
+"""
+
+STYLE_LOG = """
+    QPlainTextEdit {
+        background-color: #2c3e50;
+        color: #ecf0f1;
+        border: 1px solid #34495e;
+        border-radius: 5px;
+        padding: 5px;
+    }
+"""
+
+# Current room label outside and inside a room
+STYLE_ROOM_NONE = "color: #e74c3c; padding: 5px; border: 1px solid #e74c3c; border-radius: 3px;"
+STYLE_ROOM_JOINED = "color: #27ae60; padding: 5px; border: 1px solid #27ae60; border-radius: 3px; background-color: #d5f4e6;"
+
+
+# Auto-refresh period while the window is visible (milliseconds); with
+# server push events the timer is only a safety net
+REFRESH_INTERVAL_MS = 5000
+PUSH_REFRESH_INTERVAL_MS = 60000
+
+# Lines kept in the activity log; older ones are dropped
+LOG_MAX_LINES = 1000
+
+# Delay before scrolling the log, so a burst of lines scrolls once (ms)
+LOG_SCROLL_DELAY_MS = 100
+
+# Rows sampled when a ResizeToContents column measures its contents
+RESIZE_PRECISION = 200
+
+
+class RowTableModel(QAbstractTableModel):
+    """Read-only table model over a list of rows keyed by their first column
+    
+    Each row is turned into a tuple of display strings once, in set_rows, so
+    data() is a plain lookup however often the view repaints.
+    """
+    headers = ()
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._cells = []
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._cells)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self._cells[index.row()][index.column()]
+        return None
+    
+    def format_row(self, row):
+        """Display strings for one row"""
+        return row
+    
+    def row_data(self, row):
+        """The row object shown at index row"""
+        return self._rows[row]
+    
+    def has_rows(self, rows):
+        """Whether rows is exactly what the table already shows"""
+        return rows == self._rows
+    
+    def set_rows(self, rows):
+        """Replace the table contents, signalling only the rows that changed"""
+        rows = list(rows)
+        cells = [self.format_row(row) for row in rows]
+        new_keys = [row[0] for row in cells]
+        wanted = set(new_keys)
+        
+        # Drop rows that are gone, bottom-up so earlier indexes stay valid
+        for i in range(len(self._cells) - 1, -1, -1):
+            if self._cells[i][0] not in wanted:
+                self.beginRemoveRows(QModelIndex(), i, i)
+                del self._rows[i]
+                del self._cells[i]
+                self.endRemoveRows()
+        
+        # Reordered rows would need moves; a reset is simpler and rare
+        kept = set(row[0] for row in self._cells)
+        if [row[0] for row in self._cells] != [key for key in new_keys if key in kept]:
+            self.beginResetModel()
+            self._rows = rows
+            self._cells = cells
+            self.endResetModel()
+            return
+        
+        # Insert new rows in place and note rows whose text changed
+        first_changed = last_changed = None
+        for i, (row, row_cells) in enumerate(zip(rows, cells)):
+            if i < len(self._cells) and self._cells[i][0] == row_cells[0]:
+                if self._cells[i] != row_cells:
+                    self._rows[i] = row
+                    self._cells[i] = row_cells
+                    if first_changed is None:
+                        first_changed = i
+                    last_changed = i
+                else:
+                    self._rows[i] = row
+            else:
+                self.beginInsertRows(QModelIndex(), i, i)
+                self._rows.insert(i, row)
+                self._cells.insert(i, row_cells)
+                self.endInsertRows()
+        
+        if first_changed is not None:
+            self.dataChanged.emit(self.index(first_changed, 0),
+                                  self.index(last_changed, len(self.headers) - 1))
+
+
+class RoomsModel(RowTableModel):
+    """Rooms table; rows are (id, name, owner, member_count, created_at)"""
+    headers = ("ID", "Name", "Owner", "Members", "Created")
+    
+    def format_row(self, row):
+        room_id, name, owner, member_count, created_at = row
+        return (room_id, name, owner, str(member_count), created_at)
+
+
+class FilesModel(RowTableModel):
+    """Files table; rows are FileRow objects"""
+    headers = ("ID", "Name", "Size", "Type", "Uploader", "Date")
+    
+    def format_row(self, row):
+        return (row.id, row.name, row.size, row.type, row.uploader, row.date)
+
 
 class ClientMainWindow(QMainWindow):
     def __init__(self):
@@ -497,7 +1426,6 @@ class ClientMainWindow(QMainWindow):
         layout.setContentsMargins(10, 10, 10, 10)
         
         connect_group = QGroupBox("🔗 Connection & User Settings")
-        connect_group.setStyleSheet("QGroupBox { font-weight: bold; }")
         connect_layout = QVBoxLayout(connect_group)
         
         conn_row = QHBoxLayout()
@@ -510,9 +1438,8 @@ class ClientMainWindow(QMainWindow):
         self.port_input = QLineEdit("8888")
         self.port_input.setMaximumWidth(80)
         conn_row.addWidget(self.port_input)
-        
         conn_row.addWidget(QLabel("Username:"))
-        self.username_input = QLineEdit(f"User_{str(uuid.uuid4())[:8]}")
+        self.username_input = QLineEdit(f"User_{os.urandom(4).hex()}")
         self.username_input.setMinimumWidth(120)
         conn_row.addWidget(self.username_input)
         
@@ -537,19 +1464,18 @@ class ClientMainWindow(QMainWindow):
         layout.addWidget(connect_group)
         
         room_group = QGroupBox("🏠 Room Management")
-        room_group.setStyleSheet("QGroupBox { font-weight: bold; }")
         room_layout = QVBoxLayout(room_group)
         
         current_room_layout = QHBoxLayout()
         current_room_layout.addWidget(QLabel("Current Room:"))
         self.current_room_label = QLabel("None")
         self.current_room_label.setFont(QFont('Arial', 11, QFont.Bold))
-        self.current_room_label.setStyleSheet("color: #e74c3c; padding: 5px; border: 1px solid #e74c3c; border-radius: 3px;")
+        self.current_room_label.setStyleSheet(STYLE_ROOM_NONE)
         current_room_layout.addWidget(self.current_room_label)
         
         self.member_count_label = QLabel("Members: 0")
         self.member_count_label.setFont(QFont('Arial', 11))
-        self.member_count_label.setStyleSheet("padding: 5px;")
+        self.member_count_label.setObjectName("memberCount")
         current_room_layout.addWidget(self.member_count_label)
         
         current_room_layout.addStretch()
@@ -586,34 +1512,11 @@ class ClientMainWindow(QMainWindow):
         layout.addWidget(room_group)
         
         self.tab_widget = QTabWidget()
-        self.tab_widget.setStyleSheet("""
-            QTabWidget::pane {
-                border: 1px solid #bdc3c7;
-                border-radius: 5px;
-            }
-            QTabBar::tab {
-                background: #ecf0f1;
-                border: 1px solid #bdc3c7;
-                padding: 8px 16px;
-                margin-right: 2px;
-                border-top-left-radius: 5px;
-                border-top-right-radius: 5px;
-            }
-            QTabBar::tab:selected {
-                background: #3498db;
-                color: white;
-            }
-            QTabBar::tab:hover {
-                background: #5dade2;
-                color: white;
-            }
-        """)
         
         files_tab = QWidget()
         files_layout = QVBoxLayout(files_tab)
         
         file_ops_group = QGroupBox("📁 File Operations")
-        file_ops_group.setStyleSheet("QGroupBox { font-weight: bold; }")
         file_ops_layout = QHBoxLayout(file_ops_group)
         
         self.upload_button = QPushButton("⬆️ Upload File")
@@ -644,74 +1547,41 @@ class ClientMainWindow(QMainWindow):
         files_layout.addWidget(file_ops_group)
         
         progress_group = QGroupBox("📊 Transfer Progress")
-        progress_group.setStyleSheet("QGroupBox { font-weight: bold; }")
         progress_layout = QVBoxLayout(progress_group)
         
         upload_progress_layout = QHBoxLayout()
         upload_progress_layout.addWidget(QLabel("Upload:"))
         self.upload_progress = QProgressBar()
+        self.upload_progress.setObjectName("uploadProgress")
         self.upload_progress.setVisible(False)
-        self.upload_progress.setStyleSheet("""
-            QProgressBar {
-                border: 1px solid #bdc3c7;
-                border-radius: 5px;
-                text-align: center;
-                height: 20px;
-            }
-            QProgressBar::chunk {
-                background-color: #27ae60;
-                border-radius: 5px;
-            }
-        """)
         upload_progress_layout.addWidget(self.upload_progress)
         progress_layout.addLayout(upload_progress_layout)
         
         download_progress_layout = QHBoxLayout()
         download_progress_layout.addWidget(QLabel("Download:"))
         self.download_progress = QProgressBar()
+        self.download_progress.setObjectName("downloadProgress")
         self.download_progress.setVisible(False)
-        self.download_progress.setStyleSheet("""
-            QProgressBar {
-                border: 1px solid #bdc3c7;
-                border-radius: 5px;
-                text-align: center;
-                height: 20px;
-            }
-            QProgressBar::chunk {
-                background-color: #3498db;
-                border-radius: 5px;
-            }
-        """)
         download_progress_layout.addWidget(self.download_progress)
         progress_layout.addLayout(download_progress_layout)
         
         files_layout.addWidget(progress_group)
         
         files_list_group = QGroupBox("📋 Files in Current Room")
-        files_list_group.setStyleSheet("QGroupBox { font-weight: bold; }")
         files_list_layout = QVBoxLayout(files_list_group)
         
-        self.files_table = QTableWidget()
-        self.files_table.setColumnCount(6)
-        self.files_table.setHorizontalHeaderLabels(["ID", "Name", "Size", "Type", "Uploader", "Date"])
+        self.files_model = FilesModel(self)
+        self.files_table = QTableView()
+        self.files_table.setModel(self.files_model)
+        self.files_table.verticalHeader().setVisible(False)
         header = self.files_table.horizontalHeader()
+        header.setResizeContentsPrecision(RESIZE_PRECISION)
         header.setSectionResizeMode(QHeaderView.Stretch)
         header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        self.files_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.files_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.files_table.setAlternatingRowColors(True)
-        self.files_table.setStyleSheet("""
-            QTableWidget {
-                gridline-color: #bdc3c7;
-                background-color: #ffffff;
-                alternate-background-color: #f8f9fa;
-            }
-            QTableWidget::item:selected {
-                background-color: #3498db;
-                color: white;
-            }
-        """)
         files_list_layout.addWidget(self.files_table)
         
         files_layout.addWidget(files_list_group)
@@ -721,30 +1591,20 @@ class ClientMainWindow(QMainWindow):
         rooms_layout = QVBoxLayout(rooms_tab)
         
         rooms_list_group = QGroupBox("🏠 Available Rooms")
-        rooms_list_group.setStyleSheet("QGroupBox { font-weight: bold; }")
         rooms_list_layout = QVBoxLayout(rooms_list_group)
         
-        self.rooms_table = QTableWidget()
-        self.rooms_table.setColumnCount(5)
-        self.rooms_table.setHorizontalHeaderLabels(["ID", "Name", "Owner", "Members", "Created"])
+        self.rooms_model = RoomsModel(self)
+        self.rooms_table = QTableView()
+        self.rooms_table.setModel(self.rooms_model)
+        self.rooms_table.verticalHeader().setVisible(False)
         rooms_header = self.rooms_table.horizontalHeader()
+        rooms_header.setResizeContentsPrecision(RESIZE_PRECISION)
         rooms_header.setSectionResizeMode(QHeaderView.Stretch)
         rooms_header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
         rooms_header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
         rooms_header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
-        self.rooms_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.rooms_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.rooms_table.setAlternatingRowColors(True)
-        self.rooms_table.setStyleSheet("""
-            QTableWidget {
-                gridline-color: #bdc3c7;
-                background-color: #ffffff;
-                alternate-background-color: #f8f9fa;
-            }
-            QTableWidget::item:selected {
-                background-color: #3498db;
-                color: white;
-            }
-        """)
         self.rooms_table.doubleClicked.connect(self.join_selected_room)
         rooms_list_layout.addWidget(self.rooms_table)
         
@@ -770,21 +1630,17 @@ class ClientMainWindow(QMainWindow):
         log_layout = QVBoxLayout(log_tab)
         
         log_group = QGroupBox("📝 Activity Log")
-        log_group.setStyleSheet("QGroupBox { font-weight: bold; }")
         log_group_layout = QVBoxLayout(log_group)
         
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
         self.log_text.setFont(QFont('Consolas', 9))
-        self.log_text.setStyleSheet("""
-            QTextEdit {
-                background-color: #2c3e50;
-                color: #ecf0f1;
-                border: 1px solid #34495e;
-                border-radius: 5px;
-                padding: 5px;
-            }
-        """)
+        self.log_text.setMaximumBlockCount(LOG_MAX_LINES)
+        
+        self.log_scroll_timer = QTimer(self)
+        self.log_scroll_timer.setSingleShot(True)
+        self.log_scroll_timer.setInterval(LOG_SCROLL_DELAY_MS)
+        self.log_scroll_timer.timeout.connect(self.scroll_log_to_end)
         log_group_layout.addWidget(self.log_text)
         
         log_controls = QHBoxLayout()
@@ -801,73 +1657,15 @@ class ClientMainWindow(QMainWindow):
         layout.addWidget(self.tab_widget)
         
         self.refresh_timer = QTimer()
+        self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
         self.refresh_timer.timeout.connect(self.auto_refresh)
         
         self.log("File Sharing Client GUI initialized")
     
     def apply_styles(self):
         """Apply modern styling to the application"""
-        self.setStyleSheet("""
-            QMainWindow {
-                background-color: #f8f9fa;
-            }
-            QWidget {
-                background-color: #ffffff;
-            }
-            QGroupBox {
-                font-size: 12px;
-                font-weight: bold;
-                border: 2px solid #bdc3c7;
-                border-radius: 8px;
-                margin-top: 1ex;
-                padding-top: 10px;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 10px;
-                padding: 0 5px 0 5px;
-                color: #2c3e50;
-            }
-            QPushButton {
-                background-color: #3498db;
-                border: none;
-                color: white;
-                padding: 8px 16px;
-                border-radius: 6px;
-                font-weight: bold;
-                font-size: 11px;
-            }
-            QPushButton:hover {
-                background-color: #2980b9;
-            }
-            QPushButton:pressed {
-                background-color: #21618c;
-            }
-            QPushButton:disabled {
-                background-color: #bdc3c7;
-                color: #7f8c8d;
-            }
-            QLineEdit {
-                border: 2px solid #bdc3c7;
-                border-radius: 5px;
-                padding: 5px;
-                font-size: 11px;
-                background-color: white;
-            }
-            QLineEdit:focus {
-                border-color: #3498db;
-            }
-            QLabel {
-                color: #2c3e50;
-                font-size: 11px;
-            }
-            QStatusBar {
-                background-color: #ecf0f1;
-                border-top: 1px solid #bdc3c7;
-                color: #2c3e50;
-                font-weight: bold;
-            }
-        """)
+        # One sheet on the window; child widgets pick up their rules by selector
+        self.setStyleSheet(STYLE_BASE + STYLE_GROUPBOX + STYLE_TABS + STYLE_TABLE + STYLE_PROGRESS + STYLE_LOG)
     
     def connect_to_server(self):
         """Connect to the server"""
@@ -889,16 +1687,19 @@ class ClientMainWindow(QMainWindow):
         
         self.client_thread.log_message.connect(self.log)
         self.client_thread.connection_status_changed.connect(self.on_connection_status_changed)
-        self.client_thread.room_list_updated.connect(self.update_room_list)
-        self.client_thread.file_list_updated.connect(self.update_file_list)
+        self.client_thread.room_list_updated.connect(self.update_room_list, Qt.QueuedConnection)
+        self.client_thread.file_list_updated.connect(self.update_file_list, Qt.QueuedConnection)
         self.client_thread.room_joined.connect(self.on_room_joined)
         self.client_thread.upload_progress.connect(self.on_upload_progress)
         self.client_thread.download_progress.connect(self.on_download_progress)
         self.client_thread.room_updated.connect(self.on_room_updated)
+        self.client_thread.rooms_changed.connect(self.refresh_rooms, Qt.QueuedConnection)
+        self.client_thread.files_changed.connect(self.on_files_changed, Qt.QueuedConnection)
+        self.client_thread.push_enabled.connect(self.on_push_enabled, Qt.QueuedConnection)
         
         self.client_thread.start()
         
-        self.refresh_timer.start(5000)  # Refresh every 5 seconds
+        self.update_refresh_timer()
     
     def disconnect_from_server(self):
         """Disconnect from the server"""
@@ -908,6 +1709,7 @@ class ClientMainWindow(QMainWindow):
             self.client_thread = None
         
         self.refresh_timer.stop()
+        self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
         self.reset_ui_state()
         self.log("Disconnected from server")
     
@@ -930,13 +1732,13 @@ class ClientMainWindow(QMainWindow):
         self.username_input.setEnabled(True)
         
         self.current_room_label.setText("None")
-        self.current_room_label.setStyleSheet("color: #e74c3c; padding: 5px; border: 1px solid #e74c3c; border-radius: 3px;")
+        self.current_room_label.setStyleSheet(STYLE_ROOM_NONE)
         self.member_count_label.setText("Members: 0")
         self.status_bar.showMessage("Disconnected")
         self.status_bar.setStyleSheet("color: #e74c3c;")
         
-        self.files_table.setRowCount(0)
-        self.rooms_table.setRowCount(0)
+        self.files_model.set_rows([])
+        self.rooms_model.set_rows([])
         
         self.upload_progress.setVisible(False)
         self.download_progress.setVisible(False)
@@ -969,7 +1771,7 @@ class ClientMainWindow(QMainWindow):
         if room_id and room_name:
             self.current_room_info = {"id": room_id, "name": room_name}
             self.current_room_label.setText(f"{room_name} ({room_id})")
-            self.current_room_label.setStyleSheet("color: #27ae60; padding: 5px; border: 1px solid #27ae60; border-radius: 3px; background-color: #d5f4e6;")
+            self.current_room_label.setStyleSheet(STYLE_ROOM_JOINED)
             self.leave_room_button.setEnabled(True)
             
             self.upload_button.setEnabled(True)
@@ -984,7 +1786,7 @@ class ClientMainWindow(QMainWindow):
         else:
             self.current_room_info = {"id": None, "name": None}
             self.current_room_label.setText("None")
-            self.current_room_label.setStyleSheet("color: #e74c3c; padding: 5px; border: 1px solid #e74c3c; border-radius: 3px;")
+            self.current_room_label.setStyleSheet(STYLE_ROOM_NONE)
             self.member_count_label.setText("Members: 0")
             self.leave_room_button.setEnabled(False)
             
@@ -993,7 +1795,7 @@ class ClientMainWindow(QMainWindow):
             self.delete_file_button.setEnabled(False)
             self.refresh_files_button.setEnabled(False)
             
-            self.files_table.setRowCount(0)
+            self.files_model.set_rows([])
     
     def on_room_updated(self, room_id, room_name, member_count):
         """Handle room update event"""
@@ -1056,13 +1858,12 @@ class ClientMainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Not connected to server")
             return
         
-        selected = self.rooms_table.selectedItems()
+        selected = self.rooms_table.selectionModel().selectedRows()
         if not selected:
             QMessageBox.warning(self, "Warning", "Please select a room to join")
             return
         
-        room_id = self.rooms_table.item(selected[0].row(), 0).text()
-        room_name = self.rooms_table.item(selected[0].row(), 1).text()
+        room_id, room_name = self.rooms_model.row_data(selected[0].row())[:2]
         
         reply = QMessageBox.question(
             self, 'Join Room', 
@@ -1102,14 +1903,12 @@ class ClientMainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Not connected to server")
             return
         
-        selected = self.rooms_table.selectedItems()
+        selected = self.rooms_table.selectionModel().selectedRows()
         if not selected:
             QMessageBox.warning(self, "Warning", "Please select a room to delete")
             return
         
-        room_id = self.rooms_table.item(selected[0].row(), 0).text()
-        room_name = self.rooms_table.item(selected[0].row(), 1).text()
-        room_owner = self.rooms_table.item(selected[0].row(), 2).text()
+        room_id, room_name, room_owner = self.rooms_model.row_data(selected[0].row())[:3]
         
         if room_owner != self.username_input.text():
             QMessageBox.warning(self, "Warning", "Only the room owner can delete the room")
@@ -1148,6 +1947,15 @@ class ClientMainWindow(QMainWindow):
             elif self.current_room_info["id"]:
                 self.client_thread.list_files()
     
+    def on_files_changed(self, room_id):
+        """Refresh the files table when the server reports a change to it"""
+        if room_id == self.current_room_info["id"]:
+            self.refresh_files()
+    
+    def on_push_enabled(self, enabled):
+        """Poll rarely once the server pushes changes, often otherwise"""
+        self.refresh_timer.setInterval(PUSH_REFRESH_INTERVAL_MS if enabled else REFRESH_INTERVAL_MS)
+    
     def upload_file(self):
         """Upload a file"""
         if not self.client_thread or not self.client_thread.running:
@@ -1178,13 +1986,13 @@ class ClientMainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Not connected to server")
             return
         
-        selected = self.files_table.selectedItems()
+        selected = self.files_table.selectionModel().selectedRows()
         if not selected:
             QMessageBox.warning(self, "Warning", "Please select a file to download")
             return
         
-        file_id = self.files_table.item(selected[0].row(), 0).text()
-        filename = self.files_table.item(selected[0].row(), 1).text()
+        file = self.files_model.row_data(selected[0].row())
+        file_id, filename = file.id, file.name
         
         output_dir = QFileDialog.getExistingDirectory(self, "Select Download Directory")
         if not output_dir:
@@ -1202,13 +2010,13 @@ class ClientMainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Not connected to server")
             return
         
-        selected = self.files_table.selectedItems()
+        selected = self.files_table.selectionModel().selectedRows()
         if not selected:
             QMessageBox.warning(self, "Warning", "Please select a file to delete")
             return
         
-        file_id = self.files_table.item(selected[0].row(), 0).text()
-        filename = self.files_table.item(selected[0].row(), 1).text()
+        file = self.files_model.row_data(selected[0].row())
+        file_id, filename = file.id, file.name
         
         reply = QMessageBox.question(
             self, 'Delete File', 
@@ -1227,50 +2035,39 @@ class ClientMainWindow(QMainWindow):
     
     def update_room_list(self, rooms):
         """Update the rooms table"""
-        self.rooms_table.setRowCount(len(rooms))
+        # Most periodic refreshes bring back the same list; skip them whole
+        if self.rooms_model.has_rows(rooms):
+            return
+        self.fill_table(self.rooms_table, self.rooms_model, rooms)
         
         current_username = self.username_input.text()
-        
-        for row, room in enumerate(rooms):
-            self.rooms_table.setItem(row, 0, QTableWidgetItem(room.get('id', '')))
-            self.rooms_table.setItem(row, 1, QTableWidgetItem(room['name']))
-            self.rooms_table.setItem(row, 2, QTableWidgetItem(room['owner']))
-            self.rooms_table.setItem(row, 3, QTableWidgetItem(str(room['member_count'])))
-            self.rooms_table.setItem(row, 4, QTableWidgetItem(room['created_at']))
-            
-            if room['owner'] == current_username:
-                self.delete_room_button.setEnabled(True)
+        if any(room[2] == current_username for room in rooms):
+            self.delete_room_button.setEnabled(True)
     
     def update_file_list(self, files):
         """Update the files table"""
-        self.files_table.setRowCount(len(files))
-        
-        for row, file in enumerate(files):
-            self.files_table.setItem(row, 0, QTableWidgetItem(file['id']))
-            self.files_table.setItem(row, 1, QTableWidgetItem(file['name']))
-            self.files_table.setItem(row, 2, QTableWidgetItem(self.format_size(file['size'])))
-            self.files_table.setItem(row, 3, QTableWidgetItem(file['type']))
-            self.files_table.setItem(row, 4, QTableWidgetItem(file['uploader']))
-            self.files_table.setItem(row, 5, QTableWidgetItem(file['date']))
+        if self.files_model.has_rows(files):
+            return
+        self.fill_table(self.files_table, self.files_model, files)
     
-    def format_size(self, size_bytes):
-        """Format file size in human readable format"""
-        if size_bytes == 0:
-            return "0B"
-        
-        size_units = ['B', 'KB', 'MB', 'GB']
-        i = 0
-        while size_bytes >= 1024 and i < len(size_units) - 1:
-            size_bytes /= 1024.0
-            i += 1
-        
-        return f"{size_bytes:.1f}{size_units[i]}"
+    def fill_table(self, view, model, rows):
+        """Apply new rows with repaints held until the whole diff is in"""
+        view.setUpdatesEnabled(False)
+        try:
+            model.set_rows(rows)
+        finally:
+            view.setUpdatesEnabled(True)
     
     def log(self, message):
         """Add message to log"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.append(f"<span style='color: #3498db;'>[{timestamp}]</span> <span style='color: #ecf0f1;'>{message}</span>")
+        self.log_text.appendHtml(f"<span style='color: #3498db;'>[{timestamp}]</span> <span style='color: #ecf0f1;'>{message}</span>")
         
+        if not self.log_scroll_timer.isActive():
+            self.log_scroll_timer.start()
+    
+    def scroll_log_to_end(self):
+        """Scroll the log to its newest line"""
         scrollbar = self.log_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
     
@@ -1279,6 +2076,30 @@ class ClientMainWindow(QMainWindow):
         self.log_text.clear()
         self.log("Log cleared")
     
+    def update_refresh_timer(self):
+        """Run the auto-refresh timer only while connected and on screen"""
+        on_screen = self.isVisible() and not (self.windowState() & Qt.WindowMinimized)
+        if on_screen and self.client_thread:
+            if not self.refresh_timer.isActive():
+                self.refresh_timer.start()
+                # Catch up on whatever changed while the window was hidden
+                self.auto_refresh()
+        else:
+            self.refresh_timer.stop()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_refresh_timer()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_refresh_timer()
+    
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_refresh_timer()
+    
     def closeEvent(self, event):
         """Handle window close event"""
         if self.client_thread:
@@ -1,20 +1,176 @@
 #!/usr/bin/env python3
 # server.py - Enhanced File Sharing Server with Room Management
+import asyncio
 import socket
-import threading
 import json
 import os
 import struct
-import uuid
+import secrets
 import logging
 from datetime import datetime
 import mimetypes
 import hashlib
+import msgpack
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Wire formats, detected from the first byte of each client's requests:
+# a JSON object always starts with '{', a msgpack map never does
+CODEC_JSON = 'json'
+CODEC_MSGPACK = 'msgpack'
+
+# Seconds a client may stall in the middle of a message or file transfer
+CLIENT_TIMEOUT = 30
+
+# Upload read size, also used as the stream reader's buffer limit so a
+# single read can return a whole chunk
+TRANSFER_CHUNK = 1 << 20
+
+# Connections served at once; further clients are turned away
+MAX_CLIENTS = 256
+
+# Connections the kernel queues while the loop is busy, enough for a
+# full house of clients reconnecting at once
+LISTEN_BACKLOG = MAX_CLIENTS
+
+# Seconds the kernel (Linux) holds a new connection back until its first
+# request arrives, so the loop isn't woken for clients that send nothing
+DEFER_ACCEPT_SECONDS = 5
+
+# Worker threads for blocking disk work (file writes, hashing, deletes)
+DISK_WORKERS = 8
+
+# 4-byte big-endian length prefix of every message
+_HDR = struct.Struct('!I')
+
+# Extension -> MIME type, read from the system tables once at startup.
+# Compression suffixes ('.gz', '.tgz') are left out: '.tar.gz' is a tar
+# file to mimetypes.guess_type, not a gzip one
+mimetypes.init()
+MIME_TYPES = {ext.lower(): mime for ext, mime in mimetypes.types_map.items()
+              if ext.lower() not in mimetypes.encodings_map
+              and ext.lower() not in mimetypes.suffix_map}
+
+# Commands that may be sent inside a 'batch' request (no raw file streaming)
+BATCH_COMMANDS = {'create_room', 'join_room', 'leave_room', 'delete_room',
+                  'list_rooms', 'delete', 'list'}
+
+def encode_json(obj):
+    """Serialize to UTF-8 JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    # Compact like orjson: no spaces after separators
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def decode_json(data):
+    """Parse UTF-8 JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)  # detects UTF-8 bytes itself
+
+def splice_request_id(payload, codec, request_id):
+    """Add a request_id entry to an already encoded response map"""
+    if codec == CODEC_MSGPACK:
+        # A map of up to 15 entries has a single fixmap header byte holding
+        # the entry count; anything bigger would need a map16 header
+        if 0x80 <= payload[0] < 0x8f:
+            return bytes([payload[0] + 1]) + payload[1:] + msgpack.packb('request_id') + msgpack.packb(request_id)
+        response = msgpack.unpackb(payload, raw=False)
+        response['request_id'] = request_id
+        return msgpack.packb(response, use_bin_type=True)
+    return payload[:-1] + b',"request_id":' + encode_json(request_id) + b'}'
+
+def guess_file_type(filename):
+    """MIME type of an uploaded file, from its extension"""
+    file_type = MIME_TYPES.get(os.path.splitext(filename)[1].lower())
+    if not file_type:
+        # Compressed files
+        file_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    return file_type
+
+def remove_tree(path):
+    """Delete a directory tree in one scandir pass per directory"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # DirEntry caches the type from the directory listing, so this
+            # needs no extra stat call
+            if entry.is_dir(follow_symlinks=False):
+                remove_tree(entry.path)
+            else:
+                os.unlink(entry.path)
+    os.rmdir(path)
+
+class CachedResponse:
+    """A response shared by many clients, encoded at most once per codec
+    
+    generation is the data version the response was built from; it is
+    reused until the owner's generation moves on.
+    """
+    
+    def __init__(self, response, generation):
+        self.response = response
+        self.generation = generation
+        self.encoded = {}
+    
+    def encode(self, codec):
+        payload = self.encoded.get(codec)
+        if payload is None:
+            if codec == CODEC_MSGPACK:
+                payload = msgpack.packb(self.response, use_bin_type=True)
+            else:
+                payload = encode_json(self.response)
+            self.encoded[codec] = payload
+        return payload
+
+def error_response(message):
+    """A fixed error reply, encoded once and sent with send_cached"""
+    return CachedResponse({'status': 'error', 'message': message}, 0)
+
+# Validation errors sent on every bad request; prebuilt so sending one
+# neither builds a dict nor encodes it again
+ERR_ROOM_NOT_FOUND = error_response('Room not found')
+ERR_FILE_NOT_FOUND = error_response('File not found')
+ERR_FILE_NOT_ON_DISK = error_response('File not found on disk')
+ERR_UPLOAD_NO_ROOM = error_response('Must join a room before uploading files')
+ERR_DOWNLOAD_NO_ROOM = error_response('Must join a room before downloading files')
+ERR_DELETE_NO_ROOM = error_response('Must join a room before deleting files')
+ERR_NO_ROOM_NAME = error_response('Room name is required')
+ERR_ROOM_NAME_TOO_LONG = error_response('Room name too long (max 50 characters)')
+ERR_NO_ROOM_ID = error_response('Room ID is required')
+ERR_NOT_OWNER = error_response('Only the room owner can delete the room')
+ERR_NO_FILENAME = error_response('Filename is required')
+ERR_FILE_TOO_LARGE = error_response('File too large (max 500MB)')
+
+def store_chunk(f, digest, chunk):
+    f.write(chunk)
+    digest.update(chunk)
+
+def set_cork(writer, enabled):
+    """Hold back partial TCP segments on a connection (Linux TCP_CORK)"""
+    sock = writer.get_extra_info('socket')
+    if sock is None or not hasattr(socket, 'TCP_CORK'):
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, int(enabled))
+    except OSError:
+        pass  # Connection already gone
+
+def remove_if_exists(path):
+    # Just try it: checking with os.path.exists first costs a stat call
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
 class Room:
     def __init__(self, room_id, name, owner):
         self.id = room_id
@@ -22,6 +178,12 @@ class Room:
         self.owner = owner
         self.members = set()
         self.files = {}  # file_id -> file_info
+        # Public view of self.files as sent to clients, kept in step by
+        # add_file/remove_file so listing never rebuilds it
+        self.file_list = []
+        self.file_entries = {}  # file_id -> entry in self.file_list
+        self.files_gen = 0  # bumped whenever the file list changes
+        self.files_cache = None  # CachedResponse for 'list'
         self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # Create room directory
@@ -30,65 +192,106 @@ class Room:
     
     def add_member(self, username):
         self.members.add(username)
-        logger.info(f"User {username} joined room {self.name} ({self.id})")
+        logger.info("User %s joined room %s (%s)", username, self.name, self.id)
     
     def remove_member(self, username):
         self.members.discard(username)
-        logger.info(f"User {username} left room {self.name} ({self.id})")
+        logger.info("User %s left room %s (%s)", username, self.name, self.id)
     
     def add_file(self, file_info):
         self.files[file_info['id']] = file_info
-        logger.info(f"File {file_info['name']} added to room {self.name}")
+        entry = {
+            'id': file_info['id'],
+            'name': file_info['name'],
+            'size': file_info['size'],
+            'type': file_info['type'],
+            'uploader': file_info['uploader'],
+            'date': file_info['date']
+        }
+        self.file_entries[file_info['id']] = entry
+        self.file_list.append(entry)
+        self.files_gen += 1
+        logger.info("File %s added to room %s", file_info['name'], self.name)
     
-    def remove_file(self, file_id):
+    async def remove_file(self, file_id):
         if file_id in self.files:
             file_info = self.files[file_id]
-            file_path = os.path.join(self.room_dir, file_info['filename'])
             
-            # Delete physical file
+            # Delete physical file in a worker thread, off the event loop
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                del self.files[file_id]
-                logger.info(f"File {file_info['name']} removed from room {self.name}")
+                await asyncio.get_running_loop().run_in_executor(None, remove_if_exists, file_info['path'])
+                # A concurrent delete of the same file may have got here first
+                if self.files.pop(file_id, None) is not None:
+                    self.file_list.remove(self.file_entries.pop(file_id))
+                self.files_gen += 1
+                logger.info("File %s removed from room %s", file_info['name'], self.name)
                 return True
             except Exception as e:
-                logger.error(f"Error deleting file: {e}")
+                logger.error("Error deleting file: %s", e)
                 return False
         return False
     
     def get_file_list(self):
-        file_list = []
-        for file_id, file_info in self.files.items():
-            file_list.append({
-                'id': file_id,
-                'name': file_info['name'],
-                'size': file_info['size'],
-                'type': file_info['type'],
-                'uploader': file_info['uploader'],
-                'date': file_info['date']
-            })
-        return file_list
+        # Shared, not copied: callers only serialize it
+        return self.file_list
     
     def cleanup(self):
         """Clean up room directory and files"""
         try:
-            import shutil
             if os.path.exists(self.room_dir):
-                shutil.rmtree(self.room_dir)
-            logger.info(f"Room {self.name} directory cleaned up")
+                remove_tree(self.room_dir)
+            logger.info("Room %s directory cleaned up", self.name)
         except Exception as e:
-            logger.error(f"Error cleaning up room directory: {e}")
+            logger.error("Error cleaning up room directory: %s", e)
+
+class Client:
+    """State of one connected client"""
+    __slots__ = ('reader', 'address', 'username', 'connected_at', 'codec',
+                 'request_id', 'batch', 'busy', 'events', 'room_id')
+    
+    def __init__(self, reader, address):
+        self.reader = reader
+        self.address = address
+        self.username = 'Anonymous'
+        self.connected_at = datetime.now()
+        self.codec = CODEC_JSON
+        self.request_id = None  # id of the request being answered
+        self.batch = None  # responses collected while running a 'batch'
+        self.busy = False
+        self.events = {}  # event name -> latest event, held while busy
+        self.room_id = None
 
 class FileServer:
     def __init__(self, host='0.0.0.0', port=8888):
         self.host = host
         self.port = port
-        self.socket = None
+        self.server = None
+        self.loop = None
+        self.executor = None
         self.running = False
-        self.clients = {}  # socket -> client_info
+        self.clients = {}  # StreamWriter -> Client
         self.rooms = {}    # room_id -> Room object
-        self.client_rooms = {}  # socket -> room_id
+        # room_id -> set of StreamWriter, inverse of Client.room_id. Only read
+        # with get/pop so lookups never insert empty sets
+        self.room_clients = defaultdict(set)
+        self.rooms_gen = 0  # bumped whenever the room list changes
+        self.subscribers = set()  # writers that asked for change events
+        self.rooms_cache = None  # CachedResponse for 'list_rooms'
+        
+        # command -> (handler, reply sent if the handler raises)
+        self.handlers = {
+            'create_room': (self.handle_create_room, error_response('Failed to create room')),
+            'join_room': (self.handle_join_room, error_response('Failed to join room')),
+            'leave_room': (self.handle_leave_room, error_response('Failed to leave room')),
+            'delete_room': (self.handle_delete_room, error_response('Failed to delete room')),
+            'list_rooms': (self.handle_list_rooms, error_response('Failed to list rooms')),
+            'upload': (self.handle_upload, error_response('Upload failed')),
+            'download': (self.handle_download, error_response('Download failed')),
+            'delete': (self.handle_delete_file, error_response('Delete failed')),
+            'list': (self.handle_list_files, error_response('Failed to list files')),
+            'subscribe': (self.handle_subscribe, error_response('Failed to subscribe')),
+            'batch': (self.handle_batch, error_response('Batch failed')),
+        }
         
         # Create base directories
         os.makedirs("rooms", exist_ok=True)
@@ -96,621 +299,667 @@ class FileServer:
     def start_server(self):
         """Start the file server"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.socket.bind(('0.0.0.0', self.port))
-            self.socket.listen(10)
-            self.running = True
-            
-            logger.info(f"Server started on {self.host}:{self.port}")
-            print(f"File sharing server started on {self.host}:{self.port}")
-            
-            while self.running:
-                try:
-                    client_socket, client_address = self.socket.accept()
-                    logger.info(f"New client connected: {client_address}")
-                    
-                    # Initialize client info
-                    self.clients[client_socket] = {
-                        'address': client_address,
-                        'username': 'Anonymous',
-                        'connected_at': datetime.now()
-                    }
-                    
-                    # Start client handler thread
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket,),
-                        daemon=True
-                    )
-                    client_thread.start()
-                    
-                except Exception as e:
-                    if self.running:
-                        logger.error(f"Error accepting client: {e}")
-                        
+            asyncio.run(self.serve_forever())
         except Exception as e:
-            logger.error(f"Server error: {e}")
+            logger.error("Server error: %s", e)
         finally:
             self.cleanup()
     
+    async def serve_forever(self):
+        """Accept clients on the event loop until the server is stopped"""
+        self.loop = asyncio.get_running_loop()
+        # A fixed pool for run_in_executor(None, ...) calls
+        self.executor = ThreadPoolExecutor(max_workers=DISK_WORKERS, thread_name_prefix='disk')
+        self.loop.set_default_executor(self.executor)
+        self.server = await asyncio.start_server(
+            self.handle_client, '0.0.0.0', self.port, reuse_address=True,
+            backlog=LISTEN_BACKLOG, limit=TRANSFER_CHUNK)
+        if hasattr(socket, 'TCP_DEFER_ACCEPT'):
+            for sock in self.server.sockets:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT, DEFER_ACCEPT_SECONDS)
+        self.running = True
+        
+        logger.info("Server started on %s:%s", self.host, self.port)
+        print(f"File sharing server started on {self.host}:{self.port}")
+        
+        async with self.server:
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+    
     def stop_server(self):
         """Stop the server"""
         self.running = False
-        if self.socket:
-            self.socket.close()
+        if self.server and self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.server.close)
         logger.info("Server stopped")
     
     def cleanup(self):
         """Clean up server resources"""
-        for client_socket in list(self.clients.keys()):
+        for writer in list(self.clients.keys()):
             try:
-                client_socket.close()
+                writer.close()
             except:
                 pass
         self.clients.clear()
-        self.client_rooms.clear()
+        self.room_clients.clear()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
     
-    def send_response(self, client_socket, response):
-        """Send JSON response to client"""
+    def send_response(self, writer, response):
+        """Send response to client in the codec it spoke to us"""
         try:
-            response_data = json.dumps(response).encode('utf-8')
-            length_data = struct.pack('!I', len(response_data))
-            client_socket.send(length_data + response_data)
+            client = self.clients.get(writer)
+            if client and client.batch is not None:
+                # Collected and sent as one reply by handle_batch
+                client.batch.append(response)
+                return True
+            
+            # Echo the id of the request being answered so clients can
+            # match responses to outstanding requests
+            if client and client.request_id is not None:
+                response['request_id'] = client.request_id
+            
+            if client and client.codec == CODEC_MSGPACK:
+                response_data = msgpack.packb(response, use_bin_type=True)
+            else:
+                response_data = encode_json(response)
+            # Buffered; handle_client drains after every request. Passing
+            # header and body separately avoids copying the body to join them
+            writer.writelines((_HDR.pack(len(response_data)), response_data))
             return True
         except Exception as e:
-            logger.error(f"Error sending response: {e}")
+            logger.error("Error sending response: %s", e)
             return False
     
-    def receive_request(self, client_socket, timeout=30):
-        """Receive JSON request from client"""
+    def send_cached(self, writer, cached):
+        """Send a CachedResponse, reusing its encoded bytes"""
         try:
-            client_socket.settimeout(timeout)
-            
-            # Receive length
-            length_data = client_socket.recv(4)
-            if not length_data:
-                return None
+            client = self.clients.get(writer)
+            if client and client.batch is not None:
+                client.batch.append(cached.response)
+                return True
             
-            length = struct.unpack('!I', length_data)[0]
+            codec = client.codec if client else CODEC_JSON
+            payload = cached.encode(codec)
+            if client and client.request_id is not None:
+                payload = splice_request_id(payload, codec, client.request_id)
+            writer.writelines((_HDR.pack(len(payload)), payload))
+            return True
+        except Exception as e:
+            logger.error("Error sending response: %s", e)
+            return False
+    
+    async def receive_request(self, reader, writer):
+        """Receive JSON or msgpack request from client"""
+        try:
+            # Idle clients cost nothing on the event loop, so only a message
+            # that stalls halfway is timed out
+            length_data = await reader.readexactly(4)
+            length = _HDR.unpack(length_data)[0]
             
             # Prevent memory attacks
             if length > 10 * 1024 * 1024:  # 10MB limit
                 return None
             
-            # Receive data
-            data = b''
-            while len(data) < length:
-                chunk = client_socket.recv(min(8192, length - len(data)))
-                if not chunk:
-                    return None
-                data += chunk
+            async with asyncio.timeout(CLIENT_TIMEOUT):
+                data = await reader.readexactly(length)
+            
+            if data[:1] == b'{':
+                codec = CODEC_JSON
+                request = decode_json(data)
+            else:
+                codec = CODEC_MSGPACK
+                request = msgpack.unpackb(data, raw=False)
             
-            return json.loads(data.decode('utf-8'))
+            if writer in self.clients:
+                self.clients[writer].codec = codec
+            return request
             
-        except socket.timeout:
+        except (asyncio.IncompleteReadError, TimeoutError, ConnectionError):
             return None
         except Exception as e:
-            logger.error(f"Error receiving request: {e}")
+            logger.error("Error receiving request: %s", e)
             return None
     
-    def handle_client(self, client_socket):
+    async def handle_client(self, reader, writer):
         """Handle individual client connection"""
+        client_address = writer.get_extra_info('peername')
+        if len(self.clients) >= MAX_CLIENTS:
+            logger.warning("Refusing client %s: %s clients connected", client_address, MAX_CLIENTS)
+            writer.close()
+            return
+        logger.info("New client connected: %s", client_address)
+        
+        # Let the kernel drop peers that vanished without closing
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        
+        # Initialize client info
+        self.clients[writer] = Client(reader, client_address)
+        
         try:
             while self.running:
-                request = self.receive_request(client_socket)
+                request = await self.receive_request(reader, writer)
                 if not request:
                     break
                 
                 command = request.get('command')
-                logger.info(f"Received command: {command} from {self.clients[client_socket]['address']}")
-                
-                # Update username if provided
-                if 'username' in request:
-                    self.clients[client_socket]['username'] = request['username']
+                logger.info("Received command: %s from %s", command, self.clients[writer].address)
                 
-                # Handle commands
-                if command == 'create_room':
-                    self.handle_create_room(client_socket, request)
-                elif command == 'join_room':
-                    self.handle_join_room(client_socket, request)
-                elif command == 'leave_room':
-                    self.handle_leave_room(client_socket, request)
-                elif command == 'delete_room':
-                    self.handle_delete_room(client_socket, request)
-                elif command == 'list_rooms':
-                    self.handle_list_rooms(client_socket, request)
-                elif command == 'upload':
-                    self.handle_upload(client_socket, request)
-                elif command == 'download':
-                    self.handle_download(client_socket, request)
-                elif command == 'delete':
-                    self.handle_delete_file(client_socket, request)
-                elif command == 'list':
-                    self.handle_list_files(client_socket, request)
+                client = self.clients[writer]
+                client.request_id = request.get('request_id')
+                client.busy = True
+                try:
+                    await self.dispatch_request(writer, request)
+                finally:
+                    client.busy = False
+                self.flush_events(writer)
+                await writer.drain()
+                    
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error("Client handler error: %s", e)
+        finally:
+            self.disconnect_client(writer)
+    
+    async def dispatch_request(self, writer, request):
+        """Route a single request to its command handler"""
+        command = request.get('command')
+        
+        # Update username if provided
+        if 'username' in request:
+            self.clients[writer].username = request['username']
+        
+        # Handle commands
+        handler = self.handlers.get(command)
+        if handler is None:
+            self.send_response(writer, {
+                'status': 'error',
+                'message': f'Unknown command: {command}'
+            })
+            return
+        
+        handler, failure = handler
+        try:
+            await handler(writer, request)
+        except Exception as e:
+            logger.error("Command %s error: %s", command, e)
+            self.send_cached(writer, failure)
+    
+    async def handle_batch(self, writer, request):
+        """Handle several requests sent in one message with a single reply"""
+        ops = request.get('ops', [])
+        client = self.clients[writer]
+        results = []
+        
+        client.batch = results
+        try:
+            for op in ops:
+                command = op.get('command') if isinstance(op, dict) else None
+                if command in BATCH_COMMANDS:
+                    await self.dispatch_request(writer, op)
                 else:
-                    self.send_response(client_socket, {
+                    results.append({
                         'status': 'error',
-                        'message': f'Unknown command: {command}'
+                        'message': f'Command not allowed in batch: {command}'
                     })
-                    
-        except Exception as e:
-            logger.error(f"Client handler error: {e}")
         finally:
-            self.disconnect_client(client_socket)
+            client.batch = None
+        
+        self.send_response(writer, {
+            'status': 'success',
+            'results': results
+        })
+    
+    def publish(self, event, writers):
+        """Push an event to the subscribed writers among writers
+        
+        A client in the middle of a request gets it once that request is
+        done, so events never land inside a file transfer; repeated events
+        of one kind collapse into the latest.
+        """
+        for writer in writers:
+            client = self.clients.get(writer)
+            if client is None or writer not in self.subscribers:
+                continue
+            client.events[event['event']] = event
+            if not client.busy:
+                self.flush_events(writer)
+    
+    def flush_events(self, writer):
+        """Send the events held for a client; delivery is best-effort"""
+        client = self.clients.get(writer)
+        if not client or not client.events:
+            return
+        events = list(client.events.values())
+        client.events.clear()
+        try:
+            for event in events:
+                if client.codec == CODEC_MSGPACK:
+                    payload = msgpack.packb(event, use_bin_type=True)
+                else:
+                    payload = encode_json(event)
+                writer.writelines((_HDR.pack(len(payload)), payload))
+        except Exception as e:
+            logger.error("Error sending event: %s", e)
+    
+    def rooms_changed(self):
+        """Invalidate the room list and tell subscribers about it"""
+        self.rooms_gen += 1
+        self.publish({'event': 'rooms_changed', 'gen': self.rooms_gen}, list(self.subscribers))
+    
+    def files_changed(self, room):
+        """Tell the subscribers in room that its file list changed"""
+        self.publish({'event': 'files_changed', 'room_id': room.id, 'gen': room.files_gen},
+                     self.room_clients.get(room.id, ()))
+    
+    def assign_room(self, writer, room_id):
+        """Put a client in a room, updating both directions of the mapping"""
+        self.unassign_room(writer)
+        self.clients[writer].room_id = room_id
+        self.room_clients[room_id].add(writer)
     
-    def disconnect_client(self, client_socket):
+    def unassign_room(self, writer):
+        """Take a client out of its room, if any"""
+        client = self.clients[writer]
+        room_id, client.room_id = client.room_id, None
+        writers = self.room_clients.get(room_id)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self.room_clients[room_id]
+    
+    def disconnect_client(self, writer):
         """Clean up client connection"""
         try:
+            self.subscribers.discard(writer)
+            
             # Remove from room if in one
-            if client_socket in self.client_rooms:
-                room_id = self.client_rooms[client_socket]
-                if room_id in self.rooms:
-                    username = self.clients[client_socket]['username']
-                    self.rooms[room_id].remove_member(username)
-                del self.client_rooms[client_socket]
+            client = self.clients.get(writer)
+            if client and client.room_id is not None:
+                if client.room_id in self.rooms:
+                    self.rooms[client.room_id].remove_member(client.username)
+                    self.rooms_changed()
+                self.unassign_room(writer)
             
             # Remove client info
-            if client_socket in self.clients:
-                logger.info(f"Client disconnected: {self.clients[client_socket]['address']}")
-                del self.clients[client_socket]
+            if client:
+                logger.info("Client disconnected: %s", client.address)
+                del self.clients[writer]
             
-            client_socket.close()
+            writer.close()
             
         except Exception as e:
-            logger.error(f"Error disconnecting client: {e}")
+            logger.error("Error disconnecting client: %s", e)
     
-    def handle_create_room(self, client_socket, request):
+    async def handle_create_room(self, writer, request):
         """Handle room creation"""
-        try:
-            room_name = request.get('room_name', '').strip()
-            username = request.get('username', 'Anonymous')
-            
-            if not room_name:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room name is required'
-                })
-                return
-            
-            if len(room_name) > 50:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room name too long (max 50 characters)'
-                })
-                return
-            
-            # Generate unique room ID
-            room_id = str(uuid.uuid4())[:8]
-            
-            # Create room
-            room = Room(room_id, room_name, username)
-            room.add_member(username)
-            self.rooms[room_id] = room
-            self.client_rooms[client_socket] = room_id
-            
-            self.send_response(client_socket, {
-                'status': 'success',
-                'message': f'Room "{room_name}" created successfully',
-                'room_id': room_id,
-                'room_name': room_name
-            })
-            
-            logger.info(f"Room created: {room_name} ({room_id}) by {username}")
-            
-        except Exception as e:
-            logger.error(f"Create room error: {e}")
-            self.send_response(client_socket, {
-                'status': 'error',
-                'message': 'Failed to create room'
-            })
+        room_name = request.get('room_name', '').strip()
+        username = request.get('username', 'Anonymous')
+        
+        if not room_name:
+            self.send_cached(writer, ERR_NO_ROOM_NAME)
+            return
+        
+        if len(room_name) > 50:
+            self.send_cached(writer, ERR_ROOM_NAME_TOO_LONG)
+            return
+        
+        # Generate unique room ID
+        room_id = secrets.token_hex(4)
+        
+        # Create room
+        room = Room(room_id, room_name, username)
+        room.add_member(username)
+        self.rooms[room_id] = room
+        self.rooms_changed()
+        self.assign_room(writer, room_id)
+        
+        self.send_response(writer, {
+            'status': 'success',
+            'message': f'Room "{room_name}" created successfully',
+            'room_id': room_id,
+            'room_name': room_name
+        })
+        
+        logger.info("Room created: %s (%s) by %s", room_name, room_id, username)
     
-    def handle_join_room(self, client_socket, request):
+    async def handle_join_room(self, writer, request):
         """Handle room joining"""
-        try:
-            room_id = request.get('room_id', '').strip()
-            username = request.get('username', 'Anonymous')
-            
-            if not room_id:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room ID is required'
-                })
-                return
-            
-            if room_id not in self.rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room not found'
-                })
-                return
-            
-            # Leave current room if in one
-            if client_socket in self.client_rooms:
-                old_room_id = self.client_rooms[client_socket]
-                if old_room_id in self.rooms:
-                    self.rooms[old_room_id].remove_member(username)
-            
-            # Join new room
-            room = self.rooms[room_id]
-            room.add_member(username)
-            self.client_rooms[client_socket] = room_id
-            
-            self.send_response(client_socket, {
-                'status': 'success',
-                'message': f'Joined room "{room.name}" successfully',
-                'room_id': room_id,
-                'room_name': room.name
-            })
-            
-            logger.info(f"User {username} joined room {room.name} ({room_id})")
-            
-        except Exception as e:
-            logger.error(f"Join room error: {e}")
-            self.send_response(client_socket, {
-                'status': 'error',
-                'message': 'Failed to join room'
-            })
+        room_id = request.get('room_id', '').strip()
+        username = request.get('username', 'Anonymous')
+        
+        if not room_id:
+            self.send_cached(writer, ERR_NO_ROOM_ID)
+            return
+        
+        if room_id not in self.rooms:
+            self.send_cached(writer, ERR_ROOM_NOT_FOUND)
+            return
+        
+        # Leave current room if in one
+        old_room_id = self.clients[writer].room_id
+        if old_room_id in self.rooms:
+            self.rooms[old_room_id].remove_member(username)
+        
+        # Join new room
+        room = self.rooms[room_id]
+        room.add_member(username)
+        self.rooms_changed()
+        self.assign_room(writer, room_id)
+        
+        self.send_response(writer, {
+            'status': 'success',
+            'message': f'Joined room "{room.name}" successfully',
+            'room_id': room_id,
+            'room_name': room.name
+        })
+        
+        logger.info("User %s joined room %s (%s)", username, room.name, room_id)
     
-    def handle_leave_room(self, client_socket, request):
+    async def handle_leave_room(self, writer, request):
         """Handle leaving room"""
-        try:
-            username = self.clients[client_socket]['username']
-            
-            if client_socket not in self.client_rooms:
-                self.send_response(client_socket, {
-                    'status': 'success',
-                    'message': 'Not in any room'
-                })
-                return
-            
-            room_id = self.client_rooms[client_socket]
-            if room_id in self.rooms:
-                self.rooms[room_id].remove_member(username)
-            
-            del self.client_rooms[client_socket]
-            
-            self.send_response(client_socket, {
+        username = self.clients[writer].username
+        
+        room_id = self.clients[writer].room_id
+        if room_id is None:
+            self.send_response(writer, {
                 'status': 'success',
-                'message': 'Left room successfully'
-            })
-            
-        except Exception as e:
-            logger.error(f"Leave room error: {e}")
-            self.send_response(client_socket, {
-                'status': 'error',
-                'message': 'Failed to leave room'
+                'message': 'Not in any room'
             })
+            return
+        
+        if room_id in self.rooms:
+            self.rooms[room_id].remove_member(username)
+            self.rooms_changed()
+        
+        self.unassign_room(writer)
+        
+        self.send_response(writer, {
+            'status': 'success',
+            'message': 'Left room successfully'
+        })
     
-    def handle_delete_room(self, client_socket, request):
+    async def handle_delete_room(self, writer, request):
         """Handle room deletion"""
-        try:
-            room_id = request.get('room_id', '').strip()
-            username = self.clients[client_socket]['username']
-            
-            if not room_id or room_id not in self.rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room not found'
-                })
-                return
-            
-            room = self.rooms[room_id]
-            
-            # Check if user is the owner
-            if room.owner != username:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Only the room owner can delete the room'
-                })
-                return
-            
-            # Remove all clients from the room
-            clients_to_remove = []
-            for client_sock, client_room_id in self.client_rooms.items():
-                if client_room_id == room_id:
-                    clients_to_remove.append(client_sock)
-            
-            for client_sock in clients_to_remove:
-                del self.client_rooms[client_sock]
-            
-            # Clean up room
-            room.cleanup()
-            del self.rooms[room_id]
-            
-            self.send_response(client_socket, {
-                'status': 'success',
-                'message': f'Room "{room.name}" deleted successfully'
-            })
-            
-            logger.info(f"Room {room.name} ({room_id}) deleted by {username}")
-            
-        except Exception as e:
-            logger.error(f"Delete room error: {e}")
-            self.send_response(client_socket, {
-                'status': 'error',
-                'message': 'Failed to delete room'
-            })
+        room_id = request.get('room_id', '').strip()
+        username = self.clients[writer].username
+        
+        if not room_id or room_id not in self.rooms:
+            self.send_cached(writer, ERR_ROOM_NOT_FOUND)
+            return
+        
+        room = self.rooms[room_id]
+        
+        # Check if user is the owner
+        if room.owner != username:
+            self.send_cached(writer, ERR_NOT_OWNER)
+            return
+        
+        # Remove all clients from the room
+        for client_writer in self.room_clients.pop(room_id, ()):
+            self.clients[client_writer].room_id = None
+        
+        # Clean up room; deleting the files blocks, so use a worker thread
+        del self.rooms[room_id]
+        self.rooms_changed()
+        await asyncio.get_running_loop().run_in_executor(None, room.cleanup)
+        
+        self.send_response(writer, {
+            'status': 'success',
+            'message': f'Room "{room.name}" deleted successfully'
+        })
+        
+        logger.info("Room %s (%s) deleted by %s", room.name, room_id, username)
     
-    def handle_list_rooms(self, client_socket, request):
+    async def handle_list_rooms(self, writer, request):
         """Handle listing rooms"""
-        try:
-            rooms_list = []
-            for room_id, room in self.rooms.items():
-                rooms_list.append({
-                    'id': room_id,
-                    'name': room.name,
-                    'owner': room.owner,
-                    'member_count': len(room.members),
-                    'created_at': room.created_at
-                })
-            
-            self.send_response(client_socket, {
+        if self.rooms_cache is None or self.rooms_cache.generation != self.rooms_gen:
+            rooms_list = [{
+                'id': room_id,
+                'name': room.name,
+                'owner': room.owner,
+                'member_count': len(room.members),
+                'created_at': room.created_at
+            } for room_id, room in self.rooms.items()]
+            
+            self.rooms_cache = CachedResponse({
                 'status': 'success',
                 'rooms': rooms_list
-            })
-            
-        except Exception as e:
-            logger.error(f"List rooms error: {e}")
-            self.send_response(client_socket, {
-                'status': 'error',
-                'message': 'Failed to list rooms'
-            })
+            }, self.rooms_gen)
+        
+        self.send_cached(writer, self.rooms_cache)
     
-    def handle_upload(self, client_socket, request):
+    async def handle_upload(self, writer, request):
         """Handle file upload"""
-        try:
-            # Check if client is in a room
-            if client_socket not in self.client_rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Must join a room before uploading files'
-                })
-                return
-            
-            room_id = self.client_rooms[client_socket]
-            if room_id not in self.rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room not found'
-                })
-                return
-            
-            room = self.rooms[room_id]
-            
-            filename = request.get('filename', '')
-            file_size = request.get('file_size', 0)
-            uploader = request.get('uploader', 'Anonymous')
-            description = request.get('description', '')
-            
-            if not filename:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Filename is required'
-                })
-                return
-            
-            # Check file size limit (100MB)
-            if file_size > 500 * 1024 * 1024:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'File too large (max 500MB)'
-                })
-                return
-            
-            # Generate file ID and path
-            file_id = str(uuid.uuid4())[:12]
-            file_extension = os.path.splitext(filename)[1]
-            stored_filename = f"{file_id}{file_extension}"
-            file_path = os.path.join(room.room_dir, stored_filename)
-            
-            # Send ready response
-            self.send_response(client_socket, {
-                'status': 'ready',
-                'message': 'Ready to receive file'
-            })
-            
-            # Receive file data
-            received = 0
-            with open(file_path, 'wb') as f:
+        # Check if client is in a room
+        room_id = self.clients[writer].room_id
+        if room_id is None:
+            self.send_cached(writer, ERR_UPLOAD_NO_ROOM)
+            return
+        
+        if room_id not in self.rooms:
+            self.send_cached(writer, ERR_ROOM_NOT_FOUND)
+            return
+        
+        room = self.rooms[room_id]
+        
+        filename = request.get('filename', '')
+        file_size = request.get('file_size', 0)
+        uploader = request.get('uploader', 'Anonymous')
+        description = request.get('description', '')
+        checksum = request.get('sha256')
+        
+        if not filename:
+            self.send_cached(writer, ERR_NO_FILENAME)
+            return
+        
+        # Check file size limit (100MB)
+        if file_size > 500 * 1024 * 1024:
+            self.send_cached(writer, ERR_FILE_TOO_LARGE)
+            return
+        
+        # Generate file ID and path
+        file_id = secrets.token_hex(6)
+        file_extension = os.path.splitext(filename)[1]
+        stored_filename = f"{file_id}{file_extension}"
+        file_path = os.path.join(room.room_dir, stored_filename)
+        
+        # Send ready response
+        self.send_response(writer, {
+            'status': 'ready',
+            'message': 'Ready to receive file'
+        })
+        await writer.drain()
+        
+        # Receive file data. Writing and hashing a chunk happen in a
+        # worker thread (both release the GIL) while the next chunk is
+        # read, so uploads neither stall the event loop nor each other
+        loop = asyncio.get_running_loop()
+        reader = self.clients[writer].reader
+        received = 0
+        digest = hashlib.sha256()
+        with open(file_path, 'wb') as f:
+            pending = None
+            try:
                 while received < file_size:
-                    chunk_size = min(8192, file_size - received)
-                    chunk = client_socket.recv(chunk_size)
+                    chunk_size = min(TRANSFER_CHUNK, file_size - received)
+                    async with asyncio.timeout(CLIENT_TIMEOUT):
+                        chunk = await reader.read(chunk_size)
                     if not chunk:
                         break
-                    f.write(chunk)
+                    if pending:
+                        await pending
+                    pending = loop.run_in_executor(None, store_chunk, f, digest, chunk)
                     received += len(chunk)
-            
-            if received != file_size:
-                # Clean up incomplete file
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Incomplete file transfer'
-                })
-                return
-            
-            # Get file type
-            file_type, _ = mimetypes.guess_type(filename)
-            if not file_type:
-                file_type = 'application/octet-stream'
-            
-            # Create file info
-            file_info = {
-                'id': file_id,
-                'name': filename,
-                'filename': stored_filename,
-                'size': file_size,
-                'type': file_type,
-                'uploader': uploader,
-                'description': description,
-                'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            # Add to room
-            room.add_file(file_info)
-            
-            self.send_response(client_socket, {
-                'status': 'success',
-                'message': 'File uploaded successfully',
-                'file_id': file_id
+            finally:
+                if pending:
+                    await pending
+        
+        if received == file_size and checksum and digest.hexdigest() != checksum:
+            await loop.run_in_executor(None, remove_if_exists, file_path)
+            self.send_response(writer, {
+                'status': 'error',
+                'message': 'Checksum mismatch'
             })
-            
-            logger.info(f"File uploaded: {filename} ({file_id}) to room {room.name}")
-            
-        except Exception as e:
-            logger.error(f"Upload error: {e}")
-            self.send_response(client_socket, {
+            return
+        
+        if received != file_size:
+            # Clean up incomplete file
+            await loop.run_in_executor(None, remove_if_exists, file_path)
+            self.send_response(writer, {
                 'status': 'error',
-                'message': 'Upload failed'
+                'message': 'Incomplete file transfer'
             })
+            return
+        
+        # Get file type
+        file_type = guess_file_type(filename)
+        
+        # Create file info
+        file_info = {
+            'id': file_id,
+            'name': filename,
+            'filename': stored_filename,
+            'path': file_path,
+            'size': file_size,
+            'type': file_type,
+            'uploader': uploader,
+            'description': description,
+            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        
+        # Add to room
+        room.add_file(file_info)
+        self.files_changed(room)
+        
+        self.send_response(writer, {
+            'status': 'success',
+            'message': 'File uploaded successfully',
+            'file_id': file_id
+        })
+        
+        logger.info("File uploaded: %s (%s) to room %s", filename, file_id, room.name)
     
-    def handle_download(self, client_socket, request):
+    async def handle_download(self, writer, request):
         """Handle file download"""
+        # Check if client is in a room
+        room_id = self.clients[writer].room_id
+        if room_id is None:
+            self.send_cached(writer, ERR_DOWNLOAD_NO_ROOM)
+            return
+        
+        if room_id not in self.rooms:
+            self.send_cached(writer, ERR_ROOM_NOT_FOUND)
+            return
+        
+        room = self.rooms[room_id]
+        file_id = request.get('file_id', '')
+        
+        if file_id not in room.files:
+            self.send_cached(writer, ERR_FILE_NOT_FOUND)
+            return
+        
+        file_info = room.files[file_id]
+        file_path = file_info['path']
+        
+        # Opening is the existence check; no separate stat beforehand
         try:
-            # Check if client is in a room
-            if client_socket not in self.client_rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Must join a room before downloading files'
-                })
-                return
-            
-            room_id = self.client_rooms[client_socket]
-            if room_id not in self.rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room not found'
-                })
-                return
-            
-            room = self.rooms[room_id]
-            file_id = request.get('file_id', '')
-            
-            if file_id not in room.files:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'File not found'
-                })
-                return
-            
-            file_info = room.files[file_id]
-            file_path = os.path.join(room.room_dir, file_info['filename'])
-            
-            if not os.path.exists(file_path):
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'File not found on disk'
+            f = open(file_path, 'rb')
+        except FileNotFoundError:
+            self.send_cached(writer, ERR_FILE_NOT_ON_DISK)
+            return
+        
+        with f:
+            # asyncio turns Nagle off, so the small header would leave as a
+            # packet of its own; corked, it shares the first data segment
+            set_cork(writer, True)
+            try:
+                # Send file info response
+                self.send_response(writer, {
+                    'status': 'success',
+                    'filename': file_info['name'],
+                    'file_size': file_info['size']
                 })
-                return
-            
-            # Send file info response
-            self.send_response(client_socket, {
+                
+                # Send file data with sendfile(2) where the platform has it;
+                # the event loop falls back to read/write otherwise
+                await writer.drain()
+                await asyncio.get_running_loop().sendfile(writer.transport, f)
+            finally:
+                set_cork(writer, False)
+        
+        logger.info("File downloaded: %s (%s) from room %s", file_info['name'], file_id, room.name)
+    
+    async def handle_delete_file(self, writer, request):
+        """Handle file deletion"""
+        # Check if client is in a room
+        room_id = self.clients[writer].room_id
+        if room_id is None:
+            self.send_cached(writer, ERR_DELETE_NO_ROOM)
+            return
+        
+        if room_id not in self.rooms:
+            self.send_cached(writer, ERR_ROOM_NOT_FOUND)
+            return
+        
+        room = self.rooms[room_id]
+        file_id = request.get('file_id', '')
+        
+        if file_id not in room.files:
+            self.send_cached(writer, ERR_FILE_NOT_FOUND)
+            return
+        
+        if await room.remove_file(file_id):
+            self.files_changed(room)
+            self.send_response(writer, {
                 'status': 'success',
-                'filename': file_info['name'],
-                'file_size': file_info['size']
+                'message': 'File deleted successfully'
             })
-            
-            # Send file data
-            with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(8192)
-                    if not chunk:
-                        break
-                    client_socket.send(chunk)
-            
-            logger.info(f"File downloaded: {file_info['name']} ({file_id}) from room {room.name}")
-            
-        except Exception as e:
-            logger.error(f"Download error: {e}")
-            self.send_response(client_socket, {
+        else:
+            self.send_response(writer, {
                 'status': 'error',
-                'message': 'Download failed'
+                'message': 'Failed to delete file'
             })
     
-    def handle_delete_file(self, client_socket, request):
-        """Handle file deletion"""
-        try:
-            # Check if client is in a room
-            if client_socket not in self.client_rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Must join a room before deleting files'
-                })
-                return
-            
-            room_id = self.client_rooms[client_socket]
-            if room_id not in self.rooms:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Room not found'
-                })
-                return
-            
-            room = self.rooms[room_id]
-            file_id = request.get('file_id', '')
-            
-            if file_id not in room.files:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'File not found'
-                })
-                return
-            
-            if room.remove_file(file_id):
-                self.send_response(client_socket, {
-                    'status': 'success',
-                    'message': 'File deleted successfully'
-                })
-            else:
-                self.send_response(client_socket, {
-                    'status': 'error',
-                    'message': 'Failed to delete file'
-                })
-                
-        except Exception as e:
-            logger.error(f"Delete file error: {e}")
-            self.send_response(client_socket, {
-                'status': 'error',
-                'message': 'Delete failed'
-            })
+    async def handle_subscribe(self, writer, request):
+        """Handle a request for change events instead of polling"""
+        self.subscribers.add(writer)
+        self.send_response(writer, {
+            'status': 'success',
+            'message': 'Subscribed to room and file changes'
+        })
     
-    def handle_list_files(self, client_socket, request):
+    async def handle_list_files(self, writer, request):
         """Handle listing files"""
-        try:
-            # Check if client is in a room
-            if client_socket not in self.client_rooms:
-                self.send_response(client_socket, {
-                    'status': 'success',
-                    'files': []
-                })
-                return
-            
-            room_id = self.client_rooms[client_socket]
-            if room_id not in self.rooms:
-                self.send_response(client_socket, {
-                    'status': 'success',
-                    'files': []
-                })
-                return
-            
-            room = self.rooms[room_id]
-            files = room.get_file_list()
-            
-            self.send_response(client_socket, {
+        # Check if client is in a room
+        room_id = self.clients[writer].room_id
+        if room_id is None:
+            self.send_response(writer, {
                 'status': 'success',
-                'files': files
+                'files': []
             })
-            
-        except Exception as e:
-            logger.error(f"List files error: {e}")
-            self.send_response(client_socket, {
-                'status': 'error',
-                'message': 'Failed to list files'
+            return
+        
+        if room_id not in self.rooms:
+            self.send_response(writer, {
+                'status': 'success',
+                'files': []
             })
+            return
+        
+        room = self.rooms[room_id]
+        if room.files_cache is None or room.files_cache.generation != room.files_gen:
+            room.files_cache = CachedResponse({
+                'status': 'success',
+                'files': room.get_file_list()
+            }, room.files_gen)
+        
+        self.send_cached(writer, room.files_cache)
 
 def main():
     """Main server function"""
@@ -730,7 +979,7 @@ def main():
             server.stop_server()
     except Exception as e:
         print(f"Server error: {e}")
-        logger.error(f"Server error: {e}")
+        logger.error("Server error: %s", e)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,7 +1,9 @@
 import sys
+import codecs
+import mmap
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QAction, QFileDialog, 
                            QStatusBar, QTabWidget, QMessageBox, QPlainTextEdit)
-from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 
 # FileLoader: Reads file chunks in the background using QRunnable
 class FileLoaderSignals(QObject):
@@ -9,9 +11,9 @@ class FileLoaderSignals(QObject):
     loading_finished = pyqtSignal()  # Emits when no more data to load
 
 class FileLoader(QRunnable):
-    def __init__(self, filename, chunk_size, start_pos, end_pos):
+    def __init__(self, file_map, chunk_size, start_pos, end_pos):
         super().__init__()
-        self.filename = filename
+        self.file_map = file_map
         self.chunk_size = chunk_size
         self.start_pos = start_pos
         self.end_pos = end_pos
@@ -19,19 +21,25 @@ class FileLoader(QRunnable):
 
     def run(self):
         try:
-            with open(self.filename, 'rb') as f:  # Read the file in binary mode
-                f.seek(self.start_pos)
-                chunk_bytes = f.read(self.chunk_size)  # Read exactly chunk_size bytes
-                if chunk_bytes:
-                    # Decode the file using utf-8, ignoring invalid sequences
-                    chunk = chunk_bytes.decode('utf-8', errors='ignore')
-                    self.end_pos = self.start_pos + len(chunk_bytes)  # Determine the exact byte position
-                    if chunk:
-                        self.signals.chunk_loaded.emit(chunk, self.start_pos, self.end_pos)
-                    else:
-                        self.signals.loading_finished.emit()
+            # Slicing the memory map only pages in the part being read
+            chunk_bytes = self.file_map[self.start_pos:self.start_pos + self.chunk_size]
+            if chunk_bytes:
+                # Decode the file using utf-8, ignoring invalid sequences. A
+                # character cut in half by the chunk boundary is held back and
+                # read again at the start of the next chunk instead of dropped
+                at_end = self.start_pos + len(chunk_bytes) >= len(self.file_map)
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+                chunk = decoder.decode(chunk_bytes, final=at_end)
+                held_back = len(decoder.getstate()[0])
+                self.end_pos = self.start_pos + len(chunk_bytes) - held_back  # Determine the exact byte position
+                if chunk:
+                    self.signals.chunk_loaded.emit(chunk, self.start_pos, self.end_pos)
                 else:
                     self.signals.loading_finished.emit()
+            else:
+                self.signals.loading_finished.emit()
+        except ValueError:
+            pass  # The file was closed while this chunk waited to load
         except Exception as e:
             print(f"Error loading file: {e}")
 
@@ -41,41 +49,100 @@ class LazyTextEdit(QPlainTextEdit):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.thread_pool = QThreadPool(self)  # Thread pool for loading file chunks in the background
-        self.thread_pool.setMaxThreadCount(5)  # Limit concurrent threads
+        self.thread_pool.setMaxThreadCount(1)  # Chunks must load one after another
+        self.loader = None  # The FileLoader in flight, if any
         self.filename = None
-        self.chunk_size = 50000  # 50 KB chunks
+        self.file_map = None  # Read-only memory map of the file being loaded
+        self.chunk_size = 1 << 20  # 1 MB chunks, so a big file takes few relayouts
         self.start_pos = 0
         self.end_pos = self.chunk_size
         self.loading_done = False
+        self.word_count = 0  # Kept current by count_changed_words
+        self.block_words = [0] * self.document().blockCount()  # Word count of each block (line)
+        self.document().contentsChange.connect(self.count_changed_words)
         self.verticalScrollBar().valueChanged.connect(self.handle_scroll)
 
     def load_file(self, filename):
+        self.close_file()
         self.filename = filename
         self.clear()
         self.start_pos = 0
         self.end_pos = self.chunk_size
         self.loading_done = False
+        with open(filename, 'rb') as f:
+            if f.seek(0, 2) == 0:  # An empty file cannot be mapped
+                self.loading_done = True
+                return
+            self.file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
         self.load_next_chunk()
 
+    def close_file(self):
+        # Stop loading and unmap the file (Windows can't overwrite a mapped file)
+        self.loading_done = True
+        self.loader = None  # Whatever it still sends is ignored
+        if self.file_map is not None:
+            self.file_map.close()
+            self.file_map = None
+
     def load_next_chunk(self):
-        if self.loading_done:
+        if self.loading_done or self.file_map is None:  # Nothing (left) to load
+            return
+        if self.loader is not None:  # Scrolling again before the chunk arrived
             return
-        loader = FileLoader(self.filename, self.chunk_size, self.start_pos, self.end_pos)
-        loader.signals.chunk_loaded.connect(self.append_chunk)
-        loader.signals.loading_finished.connect(self.set_loading_done)
-        self.thread_pool.start(loader)
+        self.loader = FileLoader(self.file_map, self.chunk_size, self.start_pos, self.end_pos)
+        self.loader.signals.chunk_loaded.connect(self.append_chunk)
+        self.loader.signals.loading_finished.connect(self.set_loading_done)
+        self.thread_pool.start(self.loader)
+
+    def is_current_loader(self):
+        # False for a loader of a file that has since been closed or replaced
+        return self.loader is not None and self.sender() is self.loader.signals
 
     def append_chunk(self, text, start_pos, end_pos):
+        if not self.is_current_loader():
+            return
+        self.loader = None
         cursor = self.textCursor()
-        print(f"Appending chunk from {start_pos} to {end_pos}") #Check if the start and end positions are correct
-        cursor.movePosition(cursor.End)
-        cursor.insertText(text)
+        # Insert as one edit with painting held until the chunk is in
+        self.setUpdatesEnabled(False)
+        try:
+            cursor.beginEditBlock()
+            cursor.movePosition(cursor.End)
+            cursor.insertText(text)
+            cursor.endEditBlock()
+        finally:
+            self.setUpdatesEnabled(True)
         self.start_pos = end_pos
         self.end_pos = self.start_pos + self.chunk_size
+        if self.start_pos >= len(self.file_map):  # That was the last chunk
+            self.close_file()
         self.chunk_appended.emit()
 
+    def count_changed_words(self, position, removed, added):
+        # Recount only the lines an edit touched. block_words holds the
+        # count of every block, so the lines an edit removed (a joined line
+        # or a deleted selection) are subtracted from their stored counts
+        doc = self.document()
+        first = doc.findBlock(position)
+        last = doc.findBlock(position + added)
+        if not last.isValid():
+            last = doc.lastBlock()
+        start, stop = first.blockNumber(), last.blockNumber() + 1
+        # The same text spanned this many more (or fewer) blocks before
+        old_stop = stop + len(self.block_words) - doc.blockCount()
+        counts = []
+        block = first
+        while block.isValid():
+            counts.append(len(block.text().split()))
+            if block == last:
+                break
+            block = block.next()
+        self.word_count += sum(counts) - sum(self.block_words[start:old_stop])
+        self.block_words[start:old_stop] = counts
+
     def set_loading_done(self):
-        self.loading_done = True
+        if self.is_current_loader():
+            self.close_file()
 
     def handle_scroll(self, value):
         if not self.loading_done:
@@ -93,6 +160,12 @@ class Notepad(QMainWindow):
         self.setWindowTitle('Notepad thread handle')
         self.setGeometry(500, 200, 1080, 800)
 
+        # Recount words once typing or chunk loading pauses, not on every change
+        self.wordCountTimer = QTimer(self)
+        self.wordCountTimer.setSingleShot(True)
+        self.wordCountTimer.setInterval(100)
+        self.wordCountTimer.timeout.connect(self.updateWordCount)
+
         # Set up tab widget for multiple documents
         self.tabWidget = QTabWidget(self)
         self.tabWidget.setTabsClosable(True)
@@ -130,15 +203,13 @@ class Notepad(QMainWindow):
         textEdit = LazyTextEdit()
         index = self.tabWidget.addTab(textEdit, f'Untitled-{self.tabWidget.count() + 1}')
         self.tabWidget.setCurrentIndex(index)
-        textEdit.textChanged.connect(self.updateWordCount)
+        textEdit.textChanged.connect(self.wordCountTimer.start)
         self.updateWordCount()
 
     def updateWordCount(self):
         currentTextEdit = self.tabWidget.currentWidget()
         if currentTextEdit and isinstance(self.statusBar, QStatusBar):
-            text = currentTextEdit.toPlainText()
-            words = len(text.split())
-            self.statusBar.showMessage(f'Words: {words}')
+            self.statusBar.showMessage(f'Words: {currentTextEdit.word_count}')
 
     def openFile(self):
         fname, _ = QFileDialog.getOpenFileName(self, 'Open File', '', 'Text Files (*.txt)')
@@ -147,8 +218,8 @@ class Notepad(QMainWindow):
                 textEdit = LazyTextEdit()
                 index = self.tabWidget.addTab(textEdit, fname.split('/')[-1])
                 self.tabWidget.setCurrentIndex(index)
-                textEdit.textChanged.connect(self.updateWordCount)
-                textEdit.chunk_appended.connect(self.updateWordCount)
+                textEdit.textChanged.connect(self.wordCountTimer.start)
+                textEdit.chunk_appended.connect(self.wordCountTimer.start)
                 textEdit.load_file(fname)
                 textEdit.filename = fname
                 self.updateWordCount()
@@ -160,6 +231,7 @@ class Notepad(QMainWindow):
         if currentTextEdit:
             if hasattr(currentTextEdit, 'filename') and currentTextEdit.filename:
                 try:
+                    currentTextEdit.close_file()
                     with open(currentTextEdit.filename, 'w', encoding='utf-8') as f:
                         f.write(currentTextEdit.toPlainText())
                 except Exception as e:
@@ -174,6 +246,7 @@ class Notepad(QMainWindow):
             fname, _ = QFileDialog.getSaveFileName(self, 'Save As', '', 'Text Files (*.txt)')
             if fname:
                 try:
+                    currentTextEdit.close_file()
                     with open(fname, 'w', encoding='utf-8') as f:
                         f.write(currentTextEdit.toPlainText())
                     currentTextEdit.filename = fname
@@ -193,6 +266,8 @@ class Notepad(QMainWindow):
                 )
                 if response == QMessageBox.No:
                     return
+        if isinstance(textEdit, LazyTextEdit):
+            textEdit.close_file()
         self.tabWidget.removeTab(index)
         if isinstance(self.statusBar, QStatusBar):
             self.updateWordCount()